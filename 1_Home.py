@@ -1,108 +1,74 @@
 import streamlit as st
-import plotly.express as px
-import pandas as pd
 import streamlit.components.v1 as components  # Sử dụng cho hiển thị HTML custom
+from utils import charts, kpi, profiling
+from utils.shared import home_data, session_id, watch_data
 
 st.set_page_config(page_title="Subcon Quality Tracking", layout="wide")
 
-# Đọc dữ liệu từ 3 file CSV
-df_upper = pd.read_csv("data/upper.csv")
-df_upper["Category"] = "Upper"
-
-df_bottom = pd.read_csv("data/bottom.csv")
-df_bottom["Category"] = "Bottom"
-
-df_osc = pd.read_csv("data/outsourcing.csv")
-df_osc["Category"] = "OSC"
-
-# Kết hợp dữ liệu từ cả 3 file
-df_csv = pd.concat([df_upper, df_bottom, df_osc])
-
-# Chuyển đổi cột ngày sang dạng datetime nếu cần
-df_csv["Date"] = pd.to_datetime(df_csv["Date"])
-
-# Sidebar Filters
-st.sidebar.title("Filter Options")
-st.sidebar.write("### Filter by Date")
-start_date = st.sidebar.date_input("Start Date", min_value=df_csv["Date"].min(), value=df_csv["Date"].min())
-end_date = st.sidebar.date_input("End Date", min_value=df_csv["Date"].min(), value=df_csv["Date"].max())
-
-# Lọc dữ liệu theo khoảng ngày
-filtered_data = df_csv[(df_csv["Date"] >= pd.to_datetime(start_date)) & (df_csv["Date"] <= pd.to_datetime(end_date))]
-
-# Hiển thị 3 khung cho Upper, Bottom, OSC
-st.title("Subcon Quality Tracking System")
-
-categories = ["Upper", "Bottom", "OSC"]
-cols = st.columns(3)
-target_percent = 3  # Giả định target là 3%
-
-# Từng loại production type
-cols = st.columns([1, 2])  # Chia màn hình thành 2 cột không đều: 1 phần cho bảng số liệu, 2 phần cho biểu đồ
-
-with cols[0]:  # Cột bên trái hiển thị bảng số liệu
-    for i, category in enumerate(categories):
-        input_qty = int(filtered_data[filtered_data["Category"] == category]["Input Qty"].sum())
-        reject_qty = int(filtered_data[filtered_data["Category"] == category]["Reject Qty"].sum())
-        reject_percent = round((reject_qty / input_qty) * 100, 2) if input_qty > 0 else 0
+# Theo dõi file dữ liệu: khi file CSV được thay, dữ liệu mới được build ở luồng nền rồi trang tự chạy lại
+watch_data()
+
+# SUBCON_PROFILE=1|memory: ghi thời gian từng bước của lần chạy này (utils.profiling), hiện bảng trong sidebar
+profiling.begin_run("Home", session_id())
+try:
+    # Tổng Input/Reject theo (Category, ngày) kèm tổng lũy kế, gộp từ 3 file CSV (chỉ parse lại khi file thay đổi).
+    # Dữ liệu chỉ đọc, dùng chung cho mọi phiên; mỗi phiên chỉ giữ riêng các lựa chọn bộ lọc
+    with profiling.stage("load daily rollup"):
+        rollup = home_data()
+
+    # Sidebar Filters
+    st.sidebar.title("Filter Options")
+    st.sidebar.write("### Filter by Date")
+    start_date = st.sidebar.date_input("Start Date", min_value=rollup.first, value=rollup.first)
+    end_date = st.sidebar.date_input("End Date", min_value=rollup.first, value=rollup.last)
+
+    # Tổng Input/Reject theo Category trong khoảng ngày = hiệu hai tổng lũy kế (thời gian không phụ thuộc độ dài
+    # lịch sử), rồi % Reject (utils.kpi, dùng chung với CLI python -m utils.kpi)
+    with profiling.stage("date range totals"):
+        summary = kpi.reject_summary(rollup.totals(start_date, end_date))
+
+    # Hiển thị 3 khung cho Upper, Bottom, OSC
+    st.title("Subcon Quality Tracking System")
+
+    categories = ["Upper", "Bottom", "OSC"]
+    cols = st.columns(3)
+    target_percent = 3  # Giả định target là 3%
+
+    # Từng loại production type
+    cols = st.columns([1, 2])  # Chia màn hình thành 2 cột không đều: 1 phần cho bảng số liệu, 2 phần cho biểu đồ
+
+    with cols[0], profiling.stage("category cards"):  # Cột bên trái hiển thị bảng số liệu
+        for i, category in enumerate(categories):
+            input_qty, reject_qty, reject_percent = summary.reindex([category], fill_value=0).iloc[0]
+            input_qty, reject_qty = int(input_qty), int(reject_qty)
         
-        st.markdown(f"""
-            <div style='background-color: #f8f9fa; border: 1px solid #d1d8e0; border-radius: 10px; padding: 15px; margin-bottom: 15px; text-align: center; box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);'>
-                <h5 style='color: #4b6584; font-size: 24px; margin-bottom: 10px; margin-left: 20px'>{category}</h5>
-                <div style='display: flex; justify-content: space-around;'>
-                    <div>
-                        <strong style='font-size: 20px; color: #4b6584;'>{input_qty}</strong>
-                        <br><span style='font-size: 13px; color: #7f8c8d;'>Input Qty</span>
-                    </div>
-                    <div>
-                        <strong style='font-size: 20px; color: #4b6584;'>{reject_qty}</strong>
-                        <br><span style='font-size: 13px; color: #7f8c8d;'>Reject Qty</span>
-                    </div>
-                    <div>
-                        <strong style='font-size: 20px; color: red;'>{reject_percent:.2f}%</strong>
-                        <br><span style='font-size: 13px; color: #7f8c8d;'>% Reject</span>
+            st.markdown(f"""
+                <div style='background-color: #f8f9fa; border: 1px solid #d1d8e0; border-radius: 10px; padding: 15px; margin-bottom: 15px; text-align: center; box-shadow: 2px 2px 5px rgba(0, 0, 0, 0.1);'>
+                    <h5 style='color: #4b6584; font-size: 24px; margin-bottom: 10px; margin-left: 20px'>{category}</h5>
+                    <div style='display: flex; justify-content: space-around;'>
+                        <div>
+                            <strong style='font-size: 20px; color: #4b6584;'>{input_qty}</strong>
+                            <br><span style='font-size: 13px; color: #7f8c8d;'>Input Qty</span>
+                        </div>
+                        <div>
+                            <strong style='font-size: 20px; color: #4b6584;'>{reject_qty}</strong>
+                            <br><span style='font-size: 13px; color: #7f8c8d;'>Reject Qty</span>
+                        </div>
+                        <div>
+                            <strong style='font-size: 20px; color: red;'>{reject_percent:.2f}%</strong>
+                            <br><span style='font-size: 13px; color: #7f8c8d;'>% Reject</span>
+                        </div>
                     </div>
                 </div>
-            </div>
-        """, unsafe_allow_html=True)
-
-with cols[1]:  # Cột bên phải hiển thị biểu đồ
-    chart_data = filtered_data.groupby("Category").agg({
-        "Input Qty": "sum",
-        "Reject Qty": "sum"
-    }).reset_index()
-
-    chart_data["% Reject"] = round((chart_data["Reject Qty"] / chart_data["Input Qty"]) * 100, 2)
-
-    fig = px.bar(
-        chart_data, 
-        x="Category", 
-        y="% Reject", 
-        color="Category", 
-        labels={"% Reject": "% Reject Rate"}, 
-        title="Reject % by Production Type",
-        text="% Reject",  # Thêm text vào từng cột
-        category_orders={"Category": ["Upper", "Bottom", "OSC"]}  # Giữ thứ tự cố định
-    )
-
-    fig.update_traces(
-        texttemplate="%{text:.2f}%",  # Hiển thị số với 2 chữ số thập phân
-        textposition="inside"  # Hiển thị số liệu bên trong cột
-    )
-
-    fig.update_layout(
-        title={
-            "text": "Reject % by Production Type",
-            "y": 0.95,  # Vị trí theo trục y (0.0 là đáy, 1.0 là đỉnh)
-            "x": 0.48,   # Căn giữa theo trục x
-            "xanchor": "center",
-            "yanchor": "top"
-        },
-        uniformtext_minsize=10, 
-        uniformtext_mode="hide"
-    )
-
-    st.plotly_chart(fig, use_container_width=True)
+            """, unsafe_allow_html=True)
+
+    with cols[1], profiling.stage("reject rate chart"):  # Cột bên phải hiển thị biểu đồ
+        fig = charts.reject_rate_figure(summary)
+
+        st.plotly_chart(fig, use_container_width=True)
+finally:
+    # Chạy cả khi trang dừng giữa chừng (lỗi, st.stop()): không để lần chạy đang ghi sót sang lần chạy sau
+    profiling.debug_panel(profiling.end_run())
 
 
 
@@ -0,0 +1,162 @@
+# Đo thời gian từng bước của trang Home và Defect Tracking trên dữ liệu giả lập (benchmarks.synthetic):
+# load (parse CSV + ghi snapshot, đọc lại snapshot), build cube/chỉ mục, lọc, tính toán và dựng figure của từng
+# phần biểu đồ, xuất Excel. Mỗi quy mô dùng thư mục dữ liệu và snapshot riêng, không đụng tới data/.
+# Kết quả in ra màn hình và (tùy chọn) ghi thêm vào file CSV để so sánh giữa các lần chạy.
+# Chạy: python -m benchmarks.bench_dashboard [--scale 10 100 1000] [--work-dir /tmp/subcon_bench] [--output bench.csv]
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import SCALES, generate
+from utils import charts, cube, data_loader, filters, kpi, snapshot
+from utils.data_loader import SOURCES
+from utils.defects import defect_rate_matrix
+from utils.export import export_bytes
+from utils.report import build_report
+
+# Các bước chạy nhanh hơn ngưỡng này được chạy lại và lấy thời gian nhỏ nhất
+REPEAT_BELOW = 0.5
+REPEAT = 3
+
+
+def timed(func, repeat=True):
+    # repeat=False cho các bước có cache trong process (lần chạy lại chỉ đo cache)
+    start = time.perf_counter()
+    result = func()
+    best = time.perf_counter() - start
+    if repeat and best < REPEAT_BELOW:
+        for _ in range(REPEAT - 1):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def use_sources(paths, snapshot_dir):
+    # Trỏ các nguồn sang file giả lập, snapshot ghi vào thư mục riêng, bỏ cache của dữ liệu cũ
+    snapshot.SNAPSHOT_DIR = snapshot_dir
+    for name, path in paths.items():
+        SOURCES[name]["path"] = path
+        data_loader.forget(name)
+        cube.forget(name)
+        filters.forget(name)
+
+
+def busiest(df, column):
+    # Giá trị có nhiều dòng nhất của một cột (Supplier / Year / Week được chọn khi đo)
+    return df[column].value_counts().index[0]
+
+
+def bench_home(record, names):
+    seconds, df = timed(lambda: data_loader.load_combined(names), repeat=False)
+    record("home", "load", "combined", seconds)
+    seconds, rollup = timed(lambda: filters.DailyRollup(df, kpi.HOME_MEASURES))
+    record("home", "aggregate", "daily rollup", seconds)
+    start, end = rollup.first + (rollup.last - rollup.first) / 4, rollup.last
+    seconds, summary = timed(lambda: kpi.reject_summary(rollup.totals(start, end)))
+    record("home", "filter", "date range", seconds)
+    seconds, _ = timed(lambda: charts.reject_rate_figure(summary))
+    record("home", "figure", "reject rate", seconds)
+
+
+def bench_source(record, name):
+    seconds, _ = timed(lambda: data_loader.load_source(name), repeat=False)
+    record(name, "load", "csv -> snapshot", seconds)
+    data_loader.forget(name)
+    seconds, df_rows = timed(lambda: data_loader.load_source(name), repeat=False)
+    record(name, "load", "snapshot", seconds)
+
+    # Cube tổng hợp và bảng defect được build cùng lúc, chỉ mục lọc build trên cube đã có
+    seconds, defects = timed(lambda: cube.load_defects(name), repeat=False)
+    record(name, "load", "cube + defect table", seconds)
+    seconds, filter_index = timed(lambda: filters.cube_index(name), repeat=False)
+    record(name, "load", "filter index", seconds)
+
+    supplier = busiest(df_rows, "Supplier")
+    year = int(busiest(df_rows[df_rows["Supplier"] == supplier], "Year"))
+    week = int(busiest(df_rows[(df_rows["Supplier"] == supplier) & (df_rows["Year"] == year)], "Week"))
+    seconds, df_year = timed(lambda: filter_index.select(Supplier=supplier, Year=year))
+    record(name, "filter", "supplier + year", seconds)
+    seconds, df_selected = timed(lambda: filter_index.select(Supplier=supplier, Year=year, Week=week))
+    record(name, "filter", "supplier + year + week", seconds)
+
+    # Mỗi phần biểu đồ: bảng tổng hợp, rồi figure dựng từ bảng đó
+    for section, by in (("monthly", "Month"), ("weekly", "Week")):
+        seconds, table = timed(lambda: charts.with_rate_text(kpi.rate_table(df_year, by)))
+        record(name, "aggregate", section, seconds)
+        builder = charts.monthly_figure if section == "monthly" else charts.weekly_figure
+        for rate in kpi.RATES:
+            if rate in table.columns:
+                args = (table, rate, supplier) if section == "monthly" else (table, rate, supplier, "All")
+                seconds, _ = timed(lambda: builder(*args))
+                record(name, "figure", f"{section} {charts.rate_label(rate)}", seconds)
+
+    breakdown = SOURCES[name]["weekly_breakdown"]
+    if breakdown is not None:
+        seconds, table = timed(lambda: kpi.rate_table(df_year, ["Week", breakdown]))
+        record(name, "aggregate", "weekly breakdown", seconds)
+        seconds, _ = timed(lambda: charts.weekly_breakdown_figure(table, breakdown, supplier, "All"))
+        record(name, "figure", "weekly breakdown", seconds)
+
+    sections = (
+        ("top models", lambda: kpi.top_models(df_selected),
+         lambda table: charts.top_models_figure(table, supplier, str(week))),
+        ("pareto", lambda: defects.totals(df_selected.index),
+         lambda totals: charts.pareto_figure(totals, supplier, str(week))),
+        ("pie", lambda: defects.totals(df_selected.index),
+         lambda totals: charts.pie_figure(totals, supplier)),
+        ("heatmap", lambda: defect_rate_matrix(df_year, defects),
+         lambda matrix: charts.heatmap_figure(matrix, supplier)),
+    )
+    for section, aggregate, figure in sections:
+        seconds, table = timed(aggregate)
+        record(name, "aggregate", section, seconds)
+        seconds, _ = timed(lambda: figure(table))
+        record(name, "figure", section, seconds)
+
+    seconds, row_index = timed(lambda: filters.row_index(name), repeat=False)
+    record(name, "export", "row index", seconds)
+    df_export = row_index.select(Supplier=supplier, Year=year)
+    seconds, data = timed(lambda: export_bytes(df_export, "Excel"))
+    record(name, "export", f"excel ({len(df_export):,} rows, {len(data) / 2**20:.1f} MiB)", seconds)
+    seconds, _ = timed(lambda: build_report(name, os.devnull, year, week, workers=1))
+    record(name, "export", "bulk report (1 week)", seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the dashboard stages on synthetic data at several scales")
+    parser.add_argument("--scale", type=int, nargs="+", default=list(SCALES))
+    parser.add_argument("--work-dir", default=os.path.join("/tmp", "subcon_bench"))
+    parser.add_argument("--source", action="append", choices=list(SOURCES))
+    parser.add_argument("--output", help="append the timings to this CSV file")
+    cli_args = parser.parse_args()
+    names = tuple(cli_args.source or SOURCES)
+
+    results = []
+    for scale in cli_args.scale:
+        scale_dir = os.path.join(cli_args.work_dir, f"{scale}x")
+        seconds, paths = timed(lambda: generate(scale, scale_dir, names), repeat=False)
+        print(f"== {scale}x: " + ", ".join(f"{name} {os.path.getsize(path) / 2**20:.1f} MiB"
+                                             for name, path in paths.items()) + f" (generated in {seconds:.1f} s)")
+        snapshot_dir = os.path.join(scale_dir, ".snapshot")
+        if os.path.isdir(snapshot_dir):
+            for filename in os.listdir(snapshot_dir):
+                os.remove(os.path.join(snapshot_dir, filename))
+        use_sources(paths, snapshot_dir)
+
+        def record(source, stage, step, seconds):
+            results.append({"scale": scale, "source": source, "stage": stage, "step": step, "ms": round(seconds * 1000, 2)})
+            print(f"  {source:<12} {stage:<10} {step:<40} {seconds * 1000:10.1f} ms")
+
+        for name in names:
+            bench_source(record, name)
+            data_loader.forget(name)
+            cube.forget(name)
+            filters.forget(name)
+        bench_home(record, names)
+
+    if cli_args.output:
+        pd.DataFrame(results).to_csv(cli_args.output, mode="a", index=False,
+                                     header=not os.path.exists(cli_args.output))
@@ -0,0 +1,42 @@
+# So sánh cách xuất Excel cũ (pd.ExcelWriter dựng cả workbook trong bộ nhớ) với utils.export
+# (ghi theo từng lô dòng, xlsxwriter constant-memory), cùng CSV và Parquet.
+# Dữ liệu là dữ liệu chi tiết của OSC nhân bản nhiều lần; thời gian đo khi bật tracemalloc nên chậm hơn thực tế.
+# Chạy: python -m benchmarks.bench_export
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+from utils.data_loader import load_source
+from utils.export import EXPORT_FORMATS, export_bytes
+
+
+def legacy_excel(dataframe):
+    # Cách xuất cũ trong pages/2_Defect_Tracking.py
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        dataframe.to_excel(writer, index=False, sheet_name='Filtered Data')
+    return output.getvalue()
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(result)
+
+
+if __name__ == "__main__":
+    df_source = load_source("outsourcing")
+    for copies in (1, 10):
+        df = pd.concat([df_source] * copies, ignore_index=True)
+        print(f"{len(df):>7,} rows x {len(df.columns)} columns")
+        elapsed, peak, size = measure(lambda: legacy_excel(df))
+        print(f"  {'legacy Excel':<16} {elapsed:6.2f} s | peak {peak / 2**20:7.1f} MiB | file {size / 2**20:6.1f} MiB")
+        for fmt in EXPORT_FORMATS:
+            elapsed, peak, size = measure(lambda: export_bytes(df, fmt))
+            print(f"  {'chunked ' + fmt:<16} {elapsed:6.2f} s | peak {peak / 2**20:7.1f} MiB | file {size / 2**20:6.1f} MiB")
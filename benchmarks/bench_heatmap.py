@@ -0,0 +1,71 @@
+# So sánh cách tính heatmap cũ (melt + merge + apply + pivot) với defect_rate_matrix
+# (vector hóa, đọc số lỗi từ bảng defect dạng dài được build sẵn một lần cho mỗi phiên bản dữ liệu).
+# Thời gian build bảng defect (DefectTable.from_dense) và thời gian tính ma trận được đo riêng:
+#   per render  = legacy / matrix          (trang vẽ lại heatmap, bảng defect đã có sẵn)
+#   incl. build = legacy / (build + matrix) (lần vẽ đầu tiên sau khi dữ liệu đổi, cùng khối lượng việc với legacy)
+# Chạy: python -m benchmarks.bench_heatmap
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.defects import DefectTable, defect_rate_matrix
+
+N_MODELS = 200
+N_DEFECTS = 30
+
+
+def make_rows(n_rows, seed=0):
+    # Dữ liệu giả lập: mỗi dòng là một lần kiểm của một Model, các cột defect phần lớn bằng 0
+    rng = np.random.default_rng(seed)
+    defect_columns = [f"DEFECT {i:02d}" for i in range(N_DEFECTS)]
+    df = pd.DataFrame({
+        "Model": rng.choice([f"MODEL {i:03d}" for i in range(N_MODELS)], n_rows),
+        "Inspection Qty": rng.integers(0, 500, n_rows),
+    })
+    counts = rng.integers(1, 10, (n_rows, N_DEFECTS)) * (rng.random((n_rows, N_DEFECTS)) < 0.05)
+    df[defect_columns] = counts.astype(float)
+    return df, defect_columns
+
+
+def legacy_rate_matrix(df_heatmap, defect_columns):
+    # Cách tính cũ trong pages/2_Defect_Tracking.py
+    df_defect_counts = df_heatmap.groupby("Model")[defect_columns].sum().reset_index()
+    df_total_inspection = df_heatmap.groupby("Model")["Inspection Qty"].sum().reset_index()
+    df_total_inspection["Inspection Qty"] = df_total_inspection["Inspection Qty"].astype(float)
+    df_heatmap_melted = df_defect_counts.melt(id_vars=["Model"], var_name="Defect Type", value_name="Defect Count")
+    df_total_inspection = df_total_inspection.rename(columns={"Model": "MODEL_TEMP"})
+    df_heatmap_melted = df_heatmap_melted.merge(df_total_inspection, left_on="Model", right_on="MODEL_TEMP", how="left")
+    df_heatmap_melted.drop(columns=["MODEL_TEMP"], inplace=True)
+    df_heatmap_melted["Defect Count"] = df_heatmap_melted["Defect Count"].astype(float)
+    df_heatmap_melted["Inspection Qty"] = df_heatmap_melted["Inspection Qty"].astype(float)
+    df_heatmap_melted["Defect Rate (%)"] = df_heatmap_melted.apply(
+        lambda row: (row["Defect Count"] / row["Inspection Qty"]) * 100 if row["Inspection Qty"] > 0 else 0,
+        axis=1
+    ).round(2)
+    df_heatmap_melted = df_heatmap_melted[df_heatmap_melted["Defect Rate (%)"] > 0]
+    return df_heatmap_melted.pivot(index="Defect Type", columns="Model", values="Defect Rate (%)")
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+if __name__ == "__main__":
+    for n_rows in (10_000, 1_000_000):
+        df, defect_columns = make_rows(n_rows)
+        build_time, defects = best_of(lambda: DefectTable.from_dense(df, defect_columns))
+        legacy_time, legacy = best_of(lambda: legacy_rate_matrix(df, defect_columns))
+        matrix_time, vector = best_of(lambda: defect_rate_matrix(df, defects))
+        pd.testing.assert_frame_equal(legacy, vector, check_names=False)
+        print(f"{n_rows:>9,} rows: legacy {legacy_time * 1000:8.1f} ms | build {build_time * 1000:8.1f} ms"
+              f" + matrix {matrix_time * 1000:8.1f} ms"
+              f" | per render {legacy_time / matrix_time:5.1f}x"
+              f" | incl. build {legacy_time / (build_time + matrix_time):5.1f}x"
+              f" | defects dense {df[defect_columns].memory_usage().sum() / 2**20:6.1f} MiB"
+              f" -> sparse {defects.nbytes / 2**20:5.1f} MiB")
@@ -0,0 +1,77 @@
+# Sinh dữ liệu giả lập cùng schema với data/upper.csv, bottom.csv, outsourcing.csv (cùng cột, cùng các cột defect,
+# cùng định dạng) ở quy mô lớn hơn, mặc định 10x / 100x / 1000x số dòng mẫu, để đo hiệu năng khi dữ liệu tăng.
+# Mỗi bản sao dữ liệu mẫu được dời sang các tuần tiếp theo (lịch sử dài thêm, tối đa MAX_HISTORY_YEARS năm);
+# phần còn lại của hệ số nhân thành các Supplier mới ("EP 2", "EP 3", ...), số Model tăng theo căn bậc hai hệ số.
+# Chạy: python -m benchmarks.synthetic --scale 100 --output-dir /tmp/subcon_100x
+import argparse
+import math
+import os
+
+import pandas as pd
+
+from utils.data_loader import SOURCES
+
+SCALES = (10, 100, 1000)
+
+MAX_HISTORY_YEARS = 5
+
+
+def read_sample(name):
+    # Đọc file mẫu dạng chuỗi (giữ nguyên tên cột, ô trống và định dạng số) để file sinh ra có cùng schema
+    return pd.read_csv(SOURCES[name]["path"], dtype=str, keep_default_na=False, encoding="utf-8-sig")
+
+
+def synthetic_copy(sample, dates, copy, shift_weeks, history, model_variants):
+    # Bản sao thứ `copy` của dữ liệu mẫu: dời ngày, đổi tên Supplier/Model theo bản sao
+    df = sample.copy()
+    block, variant = copy % history, copy // history
+    shifted = dates + pd.Timedelta(weeks=block * shift_weeks)
+    df["Date"] = shifted.dt.strftime("%Y-%m-%d")
+    df["Year"] = shifted.dt.year.astype(str)
+    df["Month"] = shifted.dt.month.astype(str)
+    df["Week"] = shifted.dt.isocalendar().week.astype(str)
+    if variant:
+        df["Supplier"] = df["Supplier"] + f" {variant + 1}"
+    if copy % model_variants:
+        df["Model"] = df["Model"] + f" #{copy % model_variants + 1}"
+    return df
+
+
+def write_source(name, scale, path):
+    # Ghi file giả lập của một nguồn (từng bản sao một, không giữ cả file trong bộ nhớ); trả về số dòng
+    sample = read_sample(name)
+    dates = pd.to_datetime(sample["Date"])
+    shift_weeks = math.ceil(((dates.max() - dates.min()).days + 1) / 7)
+    history = max(1, min(scale, MAX_HISTORY_YEARS * 52 // shift_weeks))
+    model_variants = math.ceil(math.sqrt(scale))
+
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        for copy in range(scale):
+            synthetic_copy(sample, dates, copy, shift_weeks, history, model_variants).to_csv(f, index=False,
+                                                                                           header=copy == 0)
+    return len(sample) * scale
+
+
+def generate(scale, output_dir, names=tuple(SOURCES)):
+    # Sinh file cho các nguồn vào output_dir; trả về {nguồn: đường dẫn}
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name in names:
+        paths[name] = os.path.join(output_dir, os.path.basename(SOURCES[name]["path"]))
+        if not os.path.exists(paths[name]):
+            write_source(name, scale, paths[name])
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic Upper/Bottom/OSC CSV files at a larger scale")
+    parser.add_argument("--scale", type=int, default=10)
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--source", action="append", choices=list(SOURCES))
+    cli_args = parser.parse_args()
+
+    for source_name in cli_args.source or SOURCES:
+        target = os.path.join(cli_args.output_dir, os.path.basename(SOURCES[source_name]["path"]))
+        os.makedirs(cli_args.output_dir, exist_ok=True)
+        n_rows = write_source(source_name, cli_args.scale, target)
+        print(f"{target}: {n_rows:,} rows ({os.path.getsize(target) / 2**20:.1f} MiB)")
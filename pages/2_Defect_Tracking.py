@@ -1,18 +1,20 @@
 import streamlit as st
-import plotly.express as px
-import pandas as pd
-import plotly.graph_objects as go
-from io import BytesIO
-
-# Danh sách các loại sản xuất với file CSV chung
-production_type_files = {
-    "Upper": "data/upper.csv",
-    "Bottom": "data/bottom.csv",
-    "Outsourcing": "data/outsourcing.csv"
-}
+from utils.charts import (breakdown_by, heatmap_figure, monthly_figure, pareto_figure, pie_figure, top_models_figure,
+                          weekly_breakdown_figure, weekly_figure, with_rate_text)
+from utils.data_loader import SOURCES
+from utils import jobs, kpi, profiling
+from utils.export import EXPORT_FORMATS, cached_export, export_cache_key, export_file_name
+from utils.report import report_bytes, report_cache_key, report_file_name
+from utils.shared import export_index, section_result, session_id, tracking_data, watch_data
+
+# Danh sách các loại sản xuất (tên hiển thị -> nguồn dữ liệu), lấy từ cấu hình SOURCES
+production_type_files = {config["label"]: name for name, config in SOURCES.items()}
 
 st.title("Subcon Quality Tracking System")
 
+# Theo dõi file dữ liệu: khi file CSV được thay, dữ liệu mới được build ở luồng nền rồi trang tự chạy lại
+watch_data()
+
 # Sidebar - Bộ lọc
 st.sidebar.header("🔍 Filter Options")
 
@@ -23,1605 +25,324 @@ if selected_category == "Select a Category":
     st.warning("Please select a production type to view data.")
     st.stop()
 
-# Đọc dữ liệu từ file CSV chung của Production Type
-file_path = production_type_files[selected_category]
-
-
-def render_upper(file_path, selected_category):
-    # Đọc dữ liệu từ file CSV
-    df_csv = pd.read_csv(file_path, encoding="utf-8")
-
-    # Chuẩn hóa dữ liệu
-    df_csv.fillna(0, inplace=True)
-    df_csv.columns = df_csv.columns.str.strip()
-
-    # Chuyển đổi kiểu dữ liệu số
-    numeric_columns = ["Year", "Week", "Month", "Inspection Qty", "Reject Qty"]
-    for col in numeric_columns:
-        df_csv[col] = pd.to_numeric(df_csv[col], errors='coerce').fillna(0).astype(int)
-
-    # Xác định cột defect (bỏ qua các cột thông tin chung)
-    exclude_columns = ["Supplier", "Year", "Week", "Month", "Date", "Model", "PGSC", "Po",
-                       "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty", "Reject %", "Result", "REMARK"]
-    defect_columns = [col for col in df_csv.columns if col not in exclude_columns]
-
-
-    # Xác định danh sách SUBCON từ dữ liệu
-    subcon_list = sorted(df_csv["Supplier"].unique())
-    selected_subcon = st.sidebar.selectbox("🏭 Select Subcon", ["All"] + subcon_list, index=0, key="subcon")
-
-    # Nếu chưa chọn Subcon thì dừng chương trình
-    if selected_subcon == "All":
-        st.warning("Please select a Subcon to continue.")
-        st.stop()
-
-    # Bộ lọc Năm
-    year_options = sorted(df_csv["Year"].unique())
-    selected_year = st.sidebar.selectbox("📅 Select Year", ["All"] + [str(y) for y in year_options], key="year")
-    
-    # Nếu chưa chọn Year thì dừng chương trình
-    if selected_year == "All":
-        st.warning("Please select a Year to continue.")
-        st.stop()
-
-
-    # Bộ lọc Tuần
-    week_options = sorted(df_csv["Week"].unique())
-    selected_week = st.sidebar.selectbox("📅 Select Week", ["All"] + [str(w) for w in week_options], key="week")
-
-    # Lọc dữ liệu theo các bộ lọc đã chọn
-    df_filtered = df_csv.copy()
-
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    if selected_year != "All":
-        df_filtered = df_filtered[df_filtered["Year"] == int(selected_year)]
-
-    if selected_week != "All":
-        df_filtered = df_filtered[df_filtered["Week"] == int(selected_week)]
-
-    # Hiển thị tiêu đề
-    st.markdown(f"<h1 style='text-align: center;'>📌 {selected_category} - Subcon Tracking</h1>", unsafe_allow_html=True)
+# Nguồn dữ liệu chung của Production Type
+source_name = production_type_files[selected_category]
+
+# Các phần biểu đồ, mỗi phần một tab; chỉ tab đang mở mới được tính và vẽ
+SECTIONS = ["📈 Monthly Trend", "📉 Weekly Trend", "🏆 Top Models", "📊 Defect Analysis", "🍩 Defect Distribution",
+            "🔥 Heatmap"]
+
+
+@st.fragment(run_every=0.5)
+def show_export_progress(job_id):
+    # Chỉ phần tiến độ được chạy lại định kỳ; khi job xong thì chạy lại cả trang để hiện nút tải xuống
+    # (một lần cho mỗi job, các biểu đồ lấy lại từ cache)
+    job_status = jobs.status(job_id)
+    if job_status is None or job_status[0] in ("done", "failed"):
+        st.rerun()
+    state, fraction = job_status
+    st.progress(fraction, text="⏳ Waiting in queue..." if state == "queued" else f"⏳ Generating file... {fraction:.0%}")
+
+
+def render_export_job(slot):
+    # Job xuất file của phiên hiện tại (chạy nền, người dùng vẫn xem biểu đồ bình thường trong lúc chờ).
+    # slot = (phần xuất file, nguồn, các bộ lọc): mỗi phần chỉ hiện job tạo với đúng nguồn/bộ lọc đang chọn
+    export_jobs = st.session_state.setdefault("export_jobs", {})
+    export_job = export_jobs.get(slot)
+    if export_job is None:
+        return
+    job_status = jobs.status(export_job["id"])
+    if job_status is not None and job_status[0] not in ("done", "failed"):
+        show_export_progress(export_job["id"])
+        return
+    try:
+        data = jobs.result(export_job["id"]) if job_status is not None else None
+    except Exception as e:
+        st.error(f"⚠️ Export failed! {e}")
+        return
+    if data is None:
+        # Job đã hết hạn (kể cả ngay sau khi kiểm tra trạng thái): bấm tạo lại để lấy file
+        del export_jobs[slot]
+        st.info("ℹ️ The generated file has expired, please generate it again.")
+        return
+    st.download_button(
+        label=f"📥 Download {export_job['format']}",
+        data=data,
+        file_name=export_job["file_name"],
+        mime=EXPORT_FORMATS[export_job["format"]][2]
+    )
 
 
-    st.markdown("### 📥 Export Filtered Data")
-    col1, col2, col3 = st.columns([1, 1, 1])  # Chia thành 3 cột với tỷ lệ khác nhau
+@st.fragment
+def render_bulk_report(source_name, source):
+    # Báo cáo gộp tất cả Subcon: một workbook gồm sheet tổng hợp, sheet top lỗi và một sheet cho mỗi Subcon
+    # (chạy nền như job xuất file, không cần chọn Subcon trước).
+    # Fragment: chọn Year/Week hay bấm nút chỉ chạy lại phần này
+    st.markdown("### 📦 Bulk Report (All Subcons)")
+    col1, col2, col3 = st.columns([1, 1, 1])
 
     with col1:
-        export_year = st.selectbox("📅 Year", ["All"] + sorted(df_csv["Year"].unique().astype(str)))
+        report_year = st.selectbox("📅 Year", ["All"] + [str(y) for y in source.options("Year")], key="report_year")
     with col2:
-        export_week = st.selectbox("📅 Week", ["All"] + sorted(df_csv["Week"].unique().astype(str)))
+        report_week = st.selectbox("📅 Week", ["All"] + [str(w) for w in source.options("Week")], key="report_week")
     with col3:
-        st.write("")  # Tạo khoảng trống để nút nằm đúng vị trí
-        generate_btn = st.button("Generate Excel")
+        st.write("")  # Khoảng trống để căn nút nằm thẳng hàng
+        generate_btn = st.button("Generate Bulk Report", key="generate_report")
 
+    slot = ("report", source_name, report_year, report_week)
     if generate_btn:
-        # Lọc dữ liệu theo năm và tuần đã chọn
-        df_export = df_csv.copy()
-        if export_year != "All":
-            df_export = df_export[df_export["Year"] == int(export_year)]
-        if export_week != "All":
-            df_export = df_export[df_export["Week"] == int(export_week)]
-        if selected_subcon != "All":
-            df_export = df_export[df_export["Supplier"] == selected_subcon]
-
-        # Kiểm tra nếu không có dữ liệu
-        if df_export.empty:
+        year = int(report_year) if report_year != "All" else None
+        week = int(report_week) if report_week != "All" else None
+        if export_index(source_name)[1].select(Year=year, Week=week).empty:
             st.warning("⚠️ No data available for the selected filters.")
         else:
-            # Tạo file Excel từ dữ liệu đã lọc
-            def convert_to_excel(dataframe):
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    dataframe.to_excel(writer, index=False, sheet_name='Filtered Data')
-                    writer.close()
-                return output.getvalue()
-
-            excel_data = convert_to_excel(df_export)
-
-            # Nút tải xuống file Excel
-            st.download_button(
-                label="📥 Download Excel",
-                data=excel_data,
-                file_name=f"{selected_subcon}_Year{export_year}_Week{export_week}.xlsx",
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-
-    # --- 1️⃣ Monthly Defect Trend ---
-    st.subheader("1️⃣ Monthly Defect Trend")
-
-    # Lọc dữ liệu theo Production Type, Subcon và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tháng
-    df_monthly = df_filtered.groupby("Month").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum"
-    }).reset_index()
-
-    # Tính tỷ lệ lỗi (REJECT QTY / RANDOM INSPECTION QTY) * 100
-    df_monthly["Defect Rate (%)"] = (df_monthly["Reject Qty"] / df_monthly["Inspection Qty"]) * 100
-
-    # Xử lý lỗi chia cho 0 (nếu RANDOM INSPECTION QTY = 0, gán 0%)
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].fillna(0)
-
-    # Làm tròn số liệu và chuyển thành dạng chuỗi có ký hiệu `%`
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].round(2)  # Làm tròn đến 2 chữ số thập phân
-    df_monthly["Defect Rate Text"] = df_monthly["Defect Rate (%)"].astype(str) + "%"  # Thêm ký hiệu %
-
-    # Vẽ biểu đồ
-    fig_monthly = px.bar(
-        df_monthly, 
-        x="Month", 
-        y="Defect Rate (%)", 
-        text="Defect Rate Text",  # Hiển thị phần trăm trực tiếp trên cột
-        color_discrete_sequence=["#1f77b4"],  # Màu cố định cho tất cả các cột
-        title=f"Monthly Defect Rate ({selected_subcon})"
-    )
-
-    # Cập nhật trục y để hiển thị %
-    fig_monthly.update_yaxes(title_text="Defect Rate (%)")
+            report_key = report_cache_key(source_name, year, week)
+            st.session_state.setdefault("export_jobs", {})[slot] = {
+                "id": jobs.submit(report_key, lambda progress: report_bytes(source_name, year, week, progress)),
+                "file_name": report_file_name(source_name, year, week),
+                "format": "Excel",
+            }
 
-    # Chỉnh hover tooltip
-    fig_monthly.update_traces(
-        hovertemplate="<b>Month: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-    )
-
-    fig_monthly.update_xaxes(
-        title_text="Month",
-        tickmode="linear",  # Hiển thị tất cả các giá trị số
-        tickvals=list(range(1, 13)),  # Đảm bảo hiện từ tháng 1 đến tháng 12
-        tickformat="d",  # Định dạng số nguyên
-        tickangle=0  # Giữ thẳng hàng dễ đọc
-    )
-
-    st.plotly_chart(fig_monthly, use_container_width=True)
-
-    # --- 2️⃣ Weekly Defect Trend ---
-    st.subheader("2️⃣ Weekly Defect Trend")
-
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tuần
-    df_weekly = df_filtered.groupby("Week").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum"
-    }).reset_index()
-
-    # Tính toán Defect Rate (%) cho từng tuần
-    df_weekly["Defect Rate (%)"] = (df_weekly["Reject Qty"] / df_weekly["Inspection Qty"]) * 100
-    df_weekly["Defect Rate (%)"] = df_weekly["Defect Rate (%)"].fillna(0).round(2)
-    df_weekly["Defect Rate Text"] = df_weekly["Defect Rate (%)"].astype(str) + "%"
-
-    # Nếu chọn "All" tuần → vẽ Line Chart
-    if selected_week == "All":
-        fig_weekly = px.line(
-            df_weekly, x="Week", y="Defect Rate (%)",
-            markers=True, title=f"Weekly Defect Trend ({selected_subcon})"
-        )
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-    else:
-        # Lọc dữ liệu chỉ cho tuần đã chọn
-        df_week_selected = df_weekly[df_weekly["Week"] == int(selected_week)]
-
-        # Vẽ Bar Chart cho tuần được chọn
-        fig_weekly = px.bar(
-            df_week_selected, x="Week", y="Defect Rate (%)",
-            text="Defect Rate Text", 
-            title=f"Defect Rate for Week {selected_week} ({selected_subcon})"
-        )
-
-        # **Chỉ hiển thị đúng số tuần đã chọn**
-        fig_weekly.update_xaxes(
-            tickmode="array",
-            tickvals=[int(selected_week)],  # Chỉ hiển thị đúng tuần đã chọn
-            ticktext=[f"{selected_week}"]
-        )
-
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-    # Cập nhật trục y hiển thị %
-    fig_weekly.update_yaxes(title_text="Defect Rate (%)")
-
-    st.plotly_chart(fig_weekly, use_container_width=True)
-
-    # --- 3️⃣ Biểu đồ Top Model có defect cao nhất ---
-    st.subheader("3️⃣ Top Defective Models")
-
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_top_models = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_top_models = df_top_models[df_top_models["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_top_models = df_top_models[df_top_models["Week"] == int(selected_week)]
-
-    # Tính tỷ lệ defect cho từng model
-    df_top_models = df_top_models.groupby("Model").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum"
-    }).reset_index()
-
-    # Tính toán defect rate (%)
-    df_top_models["Defect Rate (%)"] = (df_top_models["Reject Qty"] / df_top_models["Inspection Qty"]) * 100
-    df_top_models["Defect Rate (%)"] = df_top_models["Defect Rate (%)"].fillna(0).round(2)
-    df_top_models["Defect Rate Text"] = df_top_models["Defect Rate (%)"].astype(str) + "%"
-
-    # Chọn Top Model có defect rate cao nhất
-    df_top_models = df_top_models.sort_values("Defect Rate (%)", ascending=False).head(3)
-
-    # Kiểm tra nếu có dữ liệu hay không
-    if df_top_models.empty:
-        st.warning("⚠️ Không có dữ liệu defect cho Model trong bộ lọc này.")
-    else:
-        # Vẽ biểu đồ
-        fig_models = px.bar(
-            df_top_models, 
-            x="Model", 
-            y="Defect Rate (%)", 
-            text="Defect Rate Text", 
-            color="Model",
-            title=f"Top Models with Highest Defect Rate ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})"
-        )
-
-        # Cập nhật trục y để hiển thị %
-        fig_models.update_yaxes(title_text="Defect Rate (%)")
-
-        # Chỉnh hover tooltip
-        fig_models.update_traces(
-            hovertemplate="<b>Model: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-        st.plotly_chart(fig_models, use_container_width=True)
-
-
-    # --- 4️⃣ Biểu đồ Pareto Chart - Defect Analysis ---
-    st.subheader("4️⃣ Defect Analysis")
-
-    # Lọc dữ liệu theo Year
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
-
-    # Đảm bảo kiểu dữ liệu số
-    df_defect_types["Defect Count"] = pd.to_numeric(df_defect_types["Defect Count"], errors='coerce').fillna(0).astype(int)
-
-    # Sắp xếp lỗi theo số lượng từ cao đến thấp
-    df_defect_types = df_defect_types[df_defect_types["Defect Count"] > 0].sort_values("Defect Count", ascending=False)
-
-    # Kiểm tra nếu không có defect nào
-    if df_defect_types.empty:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Đảm bảo cột "Defect Type" là chuỗi
-        df_defect_types["Defect Type"] = df_defect_types["Defect Type"].astype(str)
-
-        # Tính toán tỷ lệ lũy kế (Cumulative %)
-        df_defect_types["Cumulative %"] = df_defect_types["Defect Count"].cumsum() / float(df_defect_types["Defect Count"].sum()) * 100
-
-        # Vẽ biểu đồ Pareto
-        fig_pareto = go.Figure()
-
-        # Cột Defect Count (trục y bên trái)
-        fig_pareto.add_trace(go.Bar(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Defect Count"], 
-            name="Defect Count",
-            marker=dict(color="royalblue"),
-            hovertemplate="<b>Defect Type: %{x}</b><br>Defect Count: %{y}<extra></extra>"
-        ))
-
-        # Đường Cumulative % (trục y bên phải)
-        fig_pareto.add_trace(go.Scatter(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Cumulative %"],
-            mode="lines+markers",
-            name="Cumulative Percentage",
-            yaxis="y2",
-            hovertemplate="<b>Defect Type: %{x}</b><br>Cumulative %: %{y:.2f}%<extra></extra>"
-        ))
-
-        # Cấu hình trục
-        fig_pareto.update_layout(
-            title=f"Pareto Chart - Defect Types ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})",
-            xaxis=dict(title="Defect Type"),
-            yaxis=dict(title="Defect Count", side="left"),
-            yaxis2=dict(
-                title="Cumulative Percentage (%)",
-                overlaying="y",
-                side="right",
-                showgrid=False
-            ),
-            legend=dict(x=1.1, y=1),
-        )
-
-        st.plotly_chart(fig_pareto, use_container_width=True)
-
-
-    # --- 5️⃣ Biểu đồ Pie Chart - Defect Distribution by Defect Type ---
-    st.subheader("5️⃣ Defect Distribution by Defect Type")
-
-    # Lọc dữ liệu theo năm
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
-
-    # Kiểm tra nếu không có defect nào
-    if df_defect_types["Defect Count"].sum() == 0:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Tính tổng số lượng lỗi
-        total_defects = df_defect_types["Defect Count"].sum()
-
-        # Tính tỷ lệ % lỗi
-        df_defect_types["Defect Percentage"] = (df_defect_types["Defect Count"] / total_defects) * 100
-
-        # Xử lý lỗi chia cho 0 (nếu không có lỗi nào, đặt giá trị 0)
-        df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].fillna(0)
-
-        # Loại bỏ các lỗi có tỷ lệ 0%
-        df_defect_types = df_defect_types[df_defect_types["Defect Percentage"] > 0]
-
-        # Làm tròn số liệu
-        df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].round(2)
-
-        # Vẽ biểu đồ Pie Chart
-        fig_pie = px.pie(
-            df_defect_types, 
-            names="Defect Type", 
-            values="Defect Percentage",
-            title=f"Defect Distribution for Subcon: {selected_subcon}",
-            hole=0.3,  # Tạo dạng Doughnut Chart
-        )
-
-        # Cập nhật tooltip
-        fig_pie.update_traces(
-            hovertemplate="<b>Defect Type: %{label}</b><br>Defect Count: %{value:.2f}%<extra></extra>"
-        )
-
-        st.plotly_chart(fig_pie, use_container_width=True)
-
-    # --- 6️⃣ Biểu đồ Heatmap Defect Distribution by Model ---
-    st.subheader("6️⃣ Defect Distribution Heatmap by Model")
-
-    # Lọc dữ liệu theo năm
-    df_heatmap = df_csv[df_csv["Year"].astype(int) == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_heatmap = df_heatmap[df_heatmap["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_heatmap = df_heatmap[df_heatmap["Week"].astype(int) == int(selected_week)]
-
-    # Kiểm tra nếu không có dữ liệu
-    if df_heatmap.empty or len(defect_columns) == 0:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Chuyển đổi tất cả các cột defect về dạng số
-        df_heatmap[defect_columns] = df_heatmap[defect_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
-
-        # Đảm bảo MODEL luôn là chuỗi
-        df_heatmap["Model"] = df_heatmap["Model"].astype(str)
-
-        # Tổng số lỗi của từng Model theo loại lỗi
-        df_defect_counts = df_heatmap.groupby("Model")[defect_columns].sum().reset_index()
-
-        # Tổng số lượng kiểm của từng Model
-        df_total_inspection = df_heatmap.groupby("Model")["Inspection Qty"].sum().reset_index()
-
-        # Chuyển đổi dữ liệu về dạng số để tránh lỗi chia cho chuỗi
-        df_total_inspection["Inspection Qty"] = df_total_inspection["Inspection Qty"].astype(float)
-
-        # Chuyển đổi dữ liệu sang dạng cột để vẽ heatmap
-        df_heatmap_melted = df_defect_counts.melt(id_vars=["Model"], var_name="Defect Type", value_name="Defect Count")
-
-        # **🛠️ Khắc phục lỗi `MODEL` đã tồn tại khi `merge`**
-        df_total_inspection = df_total_inspection.rename(columns={"Model": "MODEL_TEMP"})  # Đổi tên cột tạm thời
-        df_heatmap_melted = df_heatmap_melted.merge(df_total_inspection, left_on="Model", right_on="MODEL_TEMP", how="left")
-        df_heatmap_melted.drop(columns=["MODEL_TEMP"], inplace=True)  # Xóa cột tạm
-
-        # Chuyển đổi tất cả các giá trị sang số
-        df_heatmap_melted["Defect Count"] = df_heatmap_melted["Defect Count"].astype(float)
-        df_heatmap_melted["Inspection Qty"] = df_heatmap_melted["Inspection Qty"].astype(float)
-
-        # Kiểm tra nếu RANDOM INSPECTION QTY = 0 thì đặt tỷ lệ lỗi = 0
-        df_heatmap_melted["Defect Rate (%)"] = df_heatmap_melted.apply(
-            lambda row: (row["Defect Count"] / row["Inspection Qty"]) * 100 if row["Inspection Qty"] > 0 else 0,
-            axis=1
-        ).round(2)
-
-        # Loại bỏ các lỗi có giá trị 0 để không hiển thị trên heatmap
-        df_heatmap_melted = df_heatmap_melted[df_heatmap_melted["Defect Rate (%)"] > 0]
-
-
-        if df_heatmap_melted.empty:
-            st.warning("⚠️ Không có dữ liệu đủ lớn để hiển thị heatmap.")
-        else:
-            # Vẽ Heatmap với màu đỏ cam, điều chỉnh kích thước rộng hơn
-            fig_heatmap = px.imshow(
-                df_heatmap_melted.pivot(index="Defect Type", columns="Model", values="Defect Rate (%)"),
-                labels=dict(x="Model", y="Defect Type", color="Defect Rate (%)"),
-                title=f"Defect Distribution Heatmap by Model ({selected_subcon})",
-                color_continuous_scale="Oranges",
-                width=1400,  # Tăng chiều rộng
-                height=900   # Tăng chiều cao
-            )
-
-            # Cập nhật tooltip để hiển thị chính xác số liệu
-            fig_heatmap.update_traces(
-                hovertemplate="<b>Model: %{x}</b><br>Defect Type: %{y}<br>Defect Rate: %{z:.2f}%<extra></extra>"
-            )
-
-            # Điều chỉnh font chữ để dễ đọc hơn
-            fig_heatmap.update_layout(
-                xaxis=dict(tickangle=45, title_font=dict(size=14), tickfont=dict(size=12)),  # Xoay label model, tăng font
-                yaxis=dict(title_font=dict(size=14), tickfont=dict(size=12)),  # Tăng font của defect type
-                margin=dict(l=100, r=100, t=80, b=100)  # Giữ khoảng cách để không bị cắt
-            )
-
-            st.plotly_chart(fig_heatmap, use_container_width=False)  # Tắt "use_container_width" để giữ kích thước cố định
-            
-
-def render_bottom(file_path, selected_category):
-    # Đọc dữ liệu từ file CSV
-    df_csv = pd.read_csv(file_path, encoding="utf-8")
-
-    # Chuẩn hóa dữ liệu
-    df_csv.fillna(0, inplace=True)
-    df_csv.columns = df_csv.columns.str.strip()
-
-    # Chuyển đổi kiểu dữ liệu số
-    numeric_columns = ["Year", "Month", "Week", "Target of Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty", "Return Qty"]
-    for col in numeric_columns:
-        df_csv[col] = pd.to_numeric(df_csv[col], errors='coerce').fillna(0).astype(int)
-
-    # Xác định cột defect (bỏ qua các cột thông tin chung)
-    exclude_columns = ["Year", "Month", "Week", "Date", "Fac.", "Model", "PGSC", "Supplier", "Part group", "Target of Input Qty", "Stock Qty", "Input Q'ty",
-                "Inspection Qty", "Pass Qty", "Reject Qty", "Return Qty", "Percent", "Return %", "Result", "REMARK"]
-    defect_columns = [col for col in df_csv.columns if col not in exclude_columns]
-
-    # Xác định danh sách SUBCON từ dữ liệu
-    subcon_list = sorted(df_csv["Supplier"].unique())
-    selected_subcon = st.sidebar.selectbox("🏭 Select Subcon", ["All"] + subcon_list, index=0, key="subcon")
-
-    # Nếu chưa chọn Subcon thì dừng chương trình
-    if selected_subcon == "All":
-        st.warning("Please select a Subcon to continue.")
-        st.stop()
-
-    # Bộ lọc Năm
-    year_options = sorted(df_csv["Year"].unique())
-    selected_year = st.sidebar.selectbox("📅 Select Year", ["All"] + [str(y) for y in year_options], key="year")
-    
-    # Nếu chưa chọn Year thì dừng chương trình
-    if selected_year == "All":
-        st.warning("Please select a Year to continue.")
-        st.stop()
-
-    # Bộ lọc Tuần
-    week_options = sorted(df_csv["Week"].unique())
-    selected_week = st.sidebar.selectbox("📅 Select Week", ["All"] + [str(w) for w in week_options], key="week")
-
-    # Lọc dữ liệu theo các bộ lọc đã chọn
-    df_filtered = df_csv.copy()
-
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    if selected_year != "All":
-        df_filtered = df_filtered[df_filtered["Year"] == int(selected_year)]
-
-    if selected_week != "All":
-        df_filtered = df_filtered[df_filtered["Week"] == int(selected_week)]
-
-    # Hiển thị tiêu đề
-    st.markdown(f"<h1 style='text-align: center;'>📌 {selected_category} - Subcon Tracking</h1>", unsafe_allow_html=True)
+    render_export_job(slot)
 
 
+@st.fragment
+def render_export(source_name, selected_subcon, year_options, week_options):
+    # Fragment: các bộ lọc Year/Week/Format của phần xuất file không ảnh hưởng biểu đồ,
+    # nên thay đổi chúng (hay bấm nút) chỉ chạy lại phần này
     st.markdown("### 📥 Export Filtered Data")
-    col1, col2, col3 = st.columns([1, 1, 1])  # Chia thành 3 cột với tỷ lệ khác nhau
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])  # Chia thành 4 cột để giao diện nhỏ gọn
 
     with col1:
-        export_year = st.selectbox("📅 Year", ["All"] + sorted(df_csv["Year"].unique().astype(str)))
+        export_year = st.selectbox("📅 Year", ["All"] + [str(y) for y in year_options], key="export_year")
     with col2:
-        export_week = st.selectbox("📅 Week", ["All"] + sorted(df_csv["Week"].unique().astype(str)))
+        export_week = st.selectbox("📅 Week", ["All"] + [str(w) for w in week_options], key="export_week")
     with col3:
-        st.write("")  # Tạo khoảng trống để nút nằm đúng vị trí
-        generate_btn = st.button("Generate Excel")
+        export_format = st.selectbox("📄 Format", list(EXPORT_FORMATS), key="export_format")
+    with col4:
+        st.write("")  # Khoảng trống để căn nút nằm thẳng hàng
+        generate_btn = st.button(f"Generate {export_format}", key="generate_excel")
 
+    slot = ("export", source_name, selected_subcon, export_year, export_week, export_format)
     if generate_btn:
-        # Lọc dữ liệu theo năm và tuần đã chọn
-        df_export = df_csv.copy()
-        if export_year != "All":
-            df_export = df_export[df_export["Year"] == int(export_year)]
-        if export_week != "All":
-            df_export = df_export[df_export["Week"] == int(export_week)]
-        if selected_subcon != "All":
-            df_export = df_export[df_export["Supplier"] == selected_subcon]
+        # Lọc dữ liệu theo năm và tuần đã chọn (xuất đầy đủ các cột chi tiết)
+        version, row_index = export_index(source_name)
+        df_export = row_index.select(
+            Supplier=selected_subcon,
+            Year=int(export_year) if export_year != "All" else None,
+            Week=int(export_week) if export_week != "All" else None
+        )
 
         # Kiểm tra nếu không có dữ liệu
         if df_export.empty:
             st.warning("⚠️ No data available for the selected filters.")
         else:
-            # Tạo file Excel từ dữ liệu đã lọc
-            def convert_to_excel(dataframe):
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    dataframe.to_excel(writer, index=False, sheet_name='Filtered Data')
-                    writer.close()
-                return output.getvalue()
-
-            excel_data = convert_to_excel(df_export)
+            # Tạo file ở luồng nền (job) thay vì chặn trang; file được ghi theo từng lô dòng và cache theo
+            # phiên bản dữ liệu + bộ lọc + định dạng, nên lần bấm sau với cùng bộ lọc trả về ngay
+            export_key = export_cache_key(source_name, version, selected_subcon, export_year, export_week,
+                                          export_format)
+            st.session_state.setdefault("export_jobs", {})[slot] = {
+                "id": jobs.submit(export_key, lambda progress: cached_export(export_key, df_export, progress)),
+                "file_name": export_file_name(selected_subcon, export_year, export_week, export_format),
+                "format": export_format,
+            }
 
-            # Nút tải xuống file Excel
-            st.download_button(
-                label="📥 Download Excel",
-                data=excel_data,
-                file_name=f"{selected_subcon}_Year{export_year}_Week{export_week}.xlsx",
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
+    render_export_job(slot)
 
 
+def render_monthly(key, selection, selected_subcon):
     # --- 1️⃣ Monthly Trend ---
     st.subheader("1️⃣ Monthly Trend")
 
-    # Lọc dữ liệu theo Production Type, Subcon và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tháng
-    df_monthly = df_filtered.groupby("Month").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-        "Return Qty": "sum",
-        "Target of Input Qty": "sum"
-    }).reset_index()
-
-    
-
-    # Monthly Defect Rate
-    # Tính tỷ lệ lỗi (Reject Qty / Inspection Qty) * 100
-    df_monthly["Defect Rate (%)"] = (df_monthly["Reject Qty"] / df_monthly["Inspection Qty"]) * 100
-
-    # Xử lý lỗi chia cho 0 (nếu Inspection Qty = 0, gán 0%)
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].fillna(0)
-
-    # Làm tròn số liệu và chuyển thành dạng chuỗi có ký hiệu `%`
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].round(2)  # Làm tròn đến 2 chữ số thập phân
-    df_monthly["Defect Rate Text"] = df_monthly["Defect Rate (%)"].astype(str) + "%"  # Thêm ký hiệu %
-
-    # Vẽ biểu đồ Monthly Defect Rate
-    fig_monthly = px.bar(
-        df_monthly, 
-        x="Month", 
-        y="Defect Rate (%)", 
-        text="Defect Rate Text",  # Hiển thị phần trăm trực tiếp trên cột
-        color_discrete_sequence=["#1f77b4"],  # Màu cố định cho tất cả các cột
-        title=f"Monthly Defect Rate ({selected_subcon})"
-    )
-
-    # Cập nhật trục y để hiển thị %
-    fig_monthly.update_yaxes(title_text="Defect Rate (%)")
-
-    # Chỉnh hover tooltip
-    fig_monthly.update_traces(
-        hovertemplate="<b>Month: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-    )
-
-    fig_monthly.update_xaxes(
-        title_text="Month",
-        tickmode="linear",  # Hiển thị tất cả các giá trị số
-        tickvals=list(range(1, 13)),  # Đảm bảo hiện từ tháng 1 đến tháng 12
-        tickformat="d",  # Định dạng số nguyên
-        tickangle=0  # Giữ thẳng hàng dễ đọc
-    )
-
-    st.plotly_chart(fig_monthly, use_container_width=True)
-
+    # Tổng số lượng kiểm tra & reject theo tháng và các tỷ lệ (%) của nguồn (Defect Rate; thêm Return Rate
+    # khi nguồn có Return Qty / Target of Input Qty), mẫu số = 0 thì 0%, làm tròn 2 chữ số
+    df_monthly = section_result(key + ("monthly",),
+                                lambda: with_rate_text(selection.rate_table("Month", whole_year=True)))
 
-    # Monthly Return Rate
-    # Tính tỷ lệ lỗi (Return Qty / Target of Input Qty) * 100
-    df_monthly["Return Rate (%)"] = (df_monthly["Return Qty"] / df_monthly["Target of Input Qty"]) * 100
+    for rate in kpi.RATES:
+        if rate in df_monthly.columns:
+            fig_monthly = section_result(key + ("monthly_figure", rate),
+                                         lambda: monthly_figure(df_monthly, rate, selected_subcon))
+            st.plotly_chart(fig_monthly, use_container_width=True)
 
-    # Xử lý lỗi chia cho 0 (nếu Inspection Qty = 0, gán 0%)
-    df_monthly["Return Rate (%)"] = df_monthly["Return Rate (%)"].fillna(0)
-
-    # Làm tròn số liệu và chuyển thành dạng chuỗi có ký hiệu `%`
-    df_monthly["Return Rate (%)"] = df_monthly["Return Rate (%)"].round(2)  # Làm tròn đến 2 chữ số thập phân
-    df_monthly["Return Rate Text"] = df_monthly["Return Rate (%)"].astype(str) + "%"  # Thêm ký hiệu %
-
-    # Vẽ biểu đồ Monthly Return Rate
-    fig_monthly = px.bar(
-        df_monthly, 
-        x="Month", 
-        y="Return Rate (%)", 
-        text="Return Rate Text",  # Hiển thị phần trăm trực tiếp trên cột
-        color_discrete_sequence=["#1f77b4"],  # Màu cố định cho tất cả các cột
-        title=f"Monthly Return Rate ({selected_subcon})"
-    )
-
-    # Cập nhật trục y để hiển thị %
-    fig_monthly.update_yaxes(title_text="Return Rate (%)")
-
-    # Chỉnh hover tooltip
-    fig_monthly.update_traces(
-        hovertemplate="<b>Month: %{x}</b><br>Return Rate: %{y:.2f}%<extra></extra>"
-    )
-
-    fig_monthly.update_xaxes(
-        title_text="Month",
-        tickmode="linear",  # Hiển thị tất cả các giá trị số
-        tickvals=list(range(1, 13)),  # Đảm bảo hiện từ tháng 1 đến tháng 12
-        tickformat="d",  # Định dạng số nguyên
-        tickangle=0  # Giữ thẳng hàng dễ đọc
-    )
 
-    st.plotly_chart(fig_monthly, use_container_width=True)
-    
-
-    # --- 2️⃣ Weekly Defect Trend ---
+def render_weekly(year_key, week_key, selection, selected_subcon, selected_week):
+    # --- 2️⃣ Weekly Trend ---
     st.subheader("2️⃣ Weekly Trend")
 
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tuần
-    df_weekly = df_filtered.groupby("Week").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-        "Return Qty": "sum",
-        "Target of Input Qty": "sum"
-    }).reset_index()
-
-    # Tính toán Defect Rate (%) cho từng tuần
-    df_weekly["Defect Rate (%)"] = (df_weekly["Reject Qty"] / df_weekly["Inspection Qty"]) * 100
-    df_weekly["Defect Rate (%)"] = df_weekly["Defect Rate (%)"].fillna(0).round(2)
-    df_weekly["Defect Rate Text"] = df_weekly["Defect Rate (%)"].astype(str) + "%"
-
-    # Nếu chọn "All" tuần → vẽ Line Chart
-    if selected_week == "All":
-        fig_weekly = px.line(
-            df_weekly, x="Week", y="Defect Rate (%)",
-            markers=True, title=f"Weekly Defect Trend ({selected_subcon})"
-        )
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-    else:
-        # Lọc dữ liệu chỉ cho tuần đã chọn
-        df_week_selected = df_weekly[df_weekly["Week"] == int(selected_week)]
-
-        # Vẽ Bar Chart cho tuần được chọn
-        fig_weekly = px.bar(
-            df_week_selected, x="Week", y="Defect Rate (%)",
-            text="Defect Rate Text", 
-            title=f"Defect Rate for Week {selected_week} ({selected_subcon})"
-        )
-
-        # **Chỉ hiển thị đúng số tuần đã chọn**
-        fig_weekly.update_xaxes(
-            tickmode="array",
-            tickvals=[int(selected_week)],  # Chỉ hiển thị đúng tuần đã chọn
-            ticktext=[f"{selected_week}"]
-        )
-
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-    # Cập nhật trục y hiển thị %
-    fig_weekly.update_yaxes(title_text="Defect Rate (%)")
-
-    st.plotly_chart(fig_weekly, use_container_width=True)
-
+    # Tổng số lượng kiểm tra & reject theo tuần và các tỷ lệ (%) cho từng tuần (không phụ thuộc tuần đã chọn)
+    df_weekly = section_result(year_key + ("weekly",),
+                               lambda: with_rate_text(selection.rate_table("Week", whole_year=True)))
 
-    # Weekly Return Rate
-    # Tính toán Return Rate (%) cho từng tuần
-    df_weekly["Return Rate (%)"] = (df_weekly["Return Qty"] / df_weekly["Target of Input Qty"]) * 100
-    df_weekly["Return Rate (%)"] = df_weekly["Return Rate (%)"].fillna(0).round(2)
-    df_weekly["Return Rate Text"] = df_weekly["Return Rate (%)"].astype(str) + "%"
+    for rate in kpi.RATES:
+        if rate in df_weekly.columns:
+            fig_weekly = section_result(week_key + ("weekly_figure", rate),
+                                        lambda: weekly_figure(df_weekly, rate, selected_subcon, selected_week))
+            st.plotly_chart(fig_weekly, use_container_width=True)
 
-    # Nếu chọn "All" tuần → vẽ Line Chart
-    if selected_week == "All":
-        fig_weekly = px.line(
-            df_weekly, x="Week", y="Return Rate (%)",
-            markers=True, title=f"Weekly Return Trend ({selected_subcon})"
-        )
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Return Rate: %{y:.2f}%<extra></extra>"
-        )
-    else:
-        # Lọc dữ liệu chỉ cho tuần đã chọn
-        df_week_selected = df_weekly[df_weekly["Week"] == int(selected_week)]
-
-        # Vẽ Bar Chart cho tuần được chọn
-        fig_weekly = px.bar(
-            df_week_selected, x="Week", y="Return Rate (%)",
-            text="Return Rate Text", 
-            title=f"Return Rate for Week {selected_week} ({selected_subcon})"
-        )
 
-        # **Chỉ hiển thị đúng số tuần đã chọn**
-        fig_weekly.update_xaxes(
-            tickmode="array",
-            tickvals=[int(selected_week)],  # Chỉ hiển thị đúng tuần đã chọn
-            ticktext=[f"{selected_week}"]
-        )
-
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Return Rate: %{y:.2f}%<extra></extra>"
-        )
-
-    # Cập nhật trục y hiển thị %
-    fig_weekly.update_yaxes(title_text="Return Rate (%)")
-
-    st.plotly_chart(fig_weekly, use_container_width=True)
+def render_weekly_breakdown(key, selection, breakdown, selected_subcon, selected_week):
+    # Defect Rate theo tuần của từng nhóm (vd. Process của OSC)
+    fig_breakdown = section_result(key + ("breakdown_figure",), lambda: weekly_breakdown_figure(
+        selection.rate_table(breakdown_by(breakdown, selected_week)), breakdown, selected_subcon, selected_week))
+    st.plotly_chart(fig_breakdown, use_container_width=True)
 
 
+def render_top_models(key, selection, selected_subcon, selected_week):
     # --- 3️⃣ Biểu đồ Top Model có defect cao nhất ---
     st.subheader("3️⃣ Top Models")
 
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_top_models = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_top_models = df_top_models[df_top_models["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_top_models = df_top_models[df_top_models["Week"] == int(selected_week)]
-
-    # Tính tỷ lệ defect cho từng model
-    df_top_models = df_top_models.groupby("Model").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-        "Return Qty": "sum",
-        "Target of Input Qty": "sum"
-    }).reset_index()
-
-    # Defect Rate
-    # Tính toán defect rate (%)
-    df_top_models["Defect Rate (%)"] = (df_top_models["Reject Qty"] / df_top_models["Inspection Qty"]) * 100
-    df_top_models["Defect Rate (%)"] = df_top_models["Defect Rate (%)"].fillna(0).round(2)
-    df_top_models["Defect Rate Text"] = df_top_models["Defect Rate (%)"].astype(str) + "%"
-
-    # Chọn Top Model có defect rate cao nhất
-    df_top_models = df_top_models.sort_values("Defect Rate (%)", ascending=False).head(3)
+    fig_models = section_result(key + ("top_models_figure",),
+                                lambda: top_models_figure(selection.top_models(), selected_subcon, selected_week))
 
     # Kiểm tra nếu có dữ liệu hay không
-    if df_top_models.empty:
+    if fig_models is None:
         st.warning("⚠️ Không có dữ liệu defect cho Model trong bộ lọc này.")
-    else:
-        # Vẽ biểu đồ
-        fig_models = px.bar(
-            df_top_models, 
-            x="Model", 
-            y="Defect Rate (%)", 
-            text="Defect Rate Text", 
-            color="Model",
-            title=f"Top Models with Highest Defect Rate ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})"
-        )
-
-        # Cập nhật trục y để hiển thị %
-        fig_models.update_yaxes(title_text="Defect Rate (%)")
-
-        # Chỉnh hover tooltip
-        fig_models.update_traces(
-            hovertemplate="<b>Model: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
+        return
 
-        st.plotly_chart(fig_models, use_container_width=True)
+    st.plotly_chart(fig_models, use_container_width=True)
 
 
+def render_pareto(key, selection, selected_subcon, selected_week):
     # --- 4️⃣ Biểu đồ Pareto Chart - Defect Analysis ---
     st.subheader("4️⃣ Defect Analysis")
 
-    # Lọc dữ liệu theo Year
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
-
-    # Đảm bảo kiểu dữ liệu số
-    df_defect_types["Defect Count"] = pd.to_numeric(df_defect_types["Defect Count"], errors='coerce').fillna(0).astype(int)
-
-    # Sắp xếp lỗi theo số lượng từ cao đến thấp
-    df_defect_types = df_defect_types[df_defect_types["Defect Count"] > 0].sort_values("Defect Count", ascending=False)
+    fig_pareto = section_result(key + ("pareto_figure",),
+                                lambda: pareto_figure(selection.defect_totals(), selected_subcon, selected_week))
 
     # Kiểm tra nếu không có defect nào
-    if df_defect_types.empty:
+    if fig_pareto is None:
         st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Đảm bảo cột "Defect Type" là chuỗi
-        df_defect_types["Defect Type"] = df_defect_types["Defect Type"].astype(str)
-
-        # Tính toán tỷ lệ lũy kế (Cumulative %)
-        df_defect_types["Cumulative %"] = df_defect_types["Defect Count"].cumsum() / float(df_defect_types["Defect Count"].sum()) * 100
-
-        # Vẽ biểu đồ Pareto
-        fig_pareto = go.Figure()
-
-        # Cột Defect Count (trục y bên trái)
-        fig_pareto.add_trace(go.Bar(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Defect Count"], 
-            name="Defect Count",
-            marker=dict(color="royalblue"),
-            hovertemplate="<b>Defect Type: %{x}</b><br>Defect Count: %{y}<extra></extra>"
-        ))
-
-        # Đường Cumulative % (trục y bên phải)
-        fig_pareto.add_trace(go.Scatter(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Cumulative %"],
-            mode="lines+markers",
-            name="Cumulative Percentage",
-            yaxis="y2",
-            hovertemplate="<b>Defect Type: %{x}</b><br>Cumulative %: %{y:.2f}%<extra></extra>"
-        ))
-
-        # Cấu hình trục
-        fig_pareto.update_layout(
-            title=f"Pareto Chart - Defect Types ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})",
-            xaxis=dict(title="Defect Type"),
-            yaxis=dict(title="Defect Count", side="left"),
-            yaxis2=dict(
-                title="Cumulative Percentage (%)",
-                overlaying="y",
-                side="right",
-                showgrid=False
-            ),
-            legend=dict(x=1.1, y=1),
-        )
+        return
 
-        st.plotly_chart(fig_pareto, use_container_width=True)
+    st.plotly_chart(fig_pareto, use_container_width=True)
 
 
+def render_pie(key, selection, selected_subcon):
     # --- 5️⃣ Biểu đồ Pie Chart - Defect Distribution by Defect Type ---
     st.subheader("5️⃣ Defect Distribution by Defect Type")
 
-    # Lọc dữ liệu theo năm
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
+    fig_pie = section_result(key + ("pie_figure",), lambda: pie_figure(selection.defect_totals(), selected_subcon))
 
     # Kiểm tra nếu không có defect nào
-    if df_defect_types["Defect Count"].sum() == 0:
+    if fig_pie is None:
         st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Tính tổng số lượng lỗi
-        total_defects = df_defect_types["Defect Count"].sum()
-
-        # Tính tỷ lệ % lỗi
-        df_defect_types["Defect Percentage"] = (df_defect_types["Defect Count"] / total_defects) * 100
-
-        # Xử lý lỗi chia cho 0 (nếu không có lỗi nào, đặt giá trị 0)
-        df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].fillna(0)
+        return
 
-        # Loại bỏ các lỗi có tỷ lệ 0%
-        df_defect_types = df_defect_types[df_defect_types["Defect Percentage"] > 0]
-
-        # Làm tròn số liệu
-        df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].round(2)
-
-        # Vẽ biểu đồ Pie Chart
-        fig_pie = px.pie(
-            df_defect_types, 
-            names="Defect Type", 
-            values="Defect Percentage",
-            title=f"Defect Distribution for Subcon: {selected_subcon}",
-            hole=0.3,  # Tạo dạng Doughnut Chart
-        )
-
-        # Cập nhật tooltip
-        fig_pie.update_traces(
-            hovertemplate="<b>Defect Type: %{label}</b><br>Defect Count: %{value:.2f}%<extra></extra>"
-        )
+    st.plotly_chart(fig_pie, use_container_width=True)
 
-        st.plotly_chart(fig_pie, use_container_width=True)
 
+def render_heatmap(key, selection, selected_subcon):
     # --- 6️⃣ Biểu đồ Heatmap Defect Distribution by Model ---
     st.subheader("6️⃣ Defect Distribution Heatmap by Model")
 
-    # Lọc dữ liệu theo năm
-    df_heatmap = df_csv[df_csv["Year"].astype(int) == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_heatmap = df_heatmap[df_heatmap["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_heatmap = df_heatmap[df_heatmap["Week"].astype(int) == int(selected_week)]
+    fig_heatmap = section_result(key + ("heatmap_figure",),
+                                 lambda: heatmap_figure(selection.defect_rate_matrix(), selected_subcon))
 
     # Kiểm tra nếu không có dữ liệu
-    if df_heatmap.empty or len(defect_columns) == 0:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Chuyển đổi tất cả các cột defect về dạng số
-        df_heatmap[defect_columns] = df_heatmap[defect_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
-
-        # Đảm bảo Model luôn là chuỗi
-        df_heatmap["Model"] = df_heatmap["Model"].astype(str)
-
-        # Tổng số lỗi của từng Model theo loại lỗi
-        df_defect_counts = df_heatmap.groupby("Model")[defect_columns].sum().reset_index()
-
-        # Tổng số lượng kiểm của từng Model
-        df_total_inspection = df_heatmap.groupby("Model")["Inspection Qty"].sum().reset_index()
-
-        # Chuyển đổi dữ liệu về dạng số để tránh lỗi chia cho chuỗi
-        df_total_inspection["Inspection Qty"] = df_total_inspection["Inspection Qty"].astype(float)
-
-        # Chuyển đổi dữ liệu sang dạng cột để vẽ heatmap
-        df_heatmap_melted = df_defect_counts.melt(id_vars=["Model"], var_name="Defect Type", value_name="Defect Count")
-
-        # **🛠️ Khắc phục lỗi `Model` đã tồn tại khi `merge`**
-        df_total_inspection = df_total_inspection.rename(columns={"Model": "Model_TEMP"})  # Đổi tên cột tạm thời
-        df_heatmap_melted = df_heatmap_melted.merge(df_total_inspection, left_on="Model", right_on="Model_TEMP", how="left")
-        df_heatmap_melted.drop(columns=["Model_TEMP"], inplace=True)  # Xóa cột tạm
-
-        # Chuyển đổi tất cả các giá trị sang số
-        df_heatmap_melted["Defect Count"] = df_heatmap_melted["Defect Count"].astype(float)
-        df_heatmap_melted["Inspection Qty"] = df_heatmap_melted["Inspection Qty"].astype(float)
-
-        # Kiểm tra nếu Inspection Qty = 0 thì đặt tỷ lệ lỗi = 0
-        df_heatmap_melted["Defect Rate (%)"] = df_heatmap_melted.apply(
-            lambda row: (row["Defect Count"] / row["Inspection Qty"]) * 100 if row["Inspection Qty"] > 0 else 0,
-            axis=1
-        ).round(2)
-
-        # Loại bỏ các lỗi có giá trị 0 để không hiển thị trên heatmap
-        df_heatmap_melted = df_heatmap_melted[df_heatmap_melted["Defect Rate (%)"] > 0]
-
-        if df_heatmap_melted.empty:
-            st.warning("⚠️ Không có dữ liệu đủ lớn để hiển thị heatmap.")
-        else:
-            # Vẽ Heatmap với màu đỏ cam, điều chỉnh kích thước rộng hơn
-            fig_heatmap = px.imshow(
-                df_heatmap_melted.pivot(index="Defect Type", columns="Model", values="Defect Rate (%)"),
-                labels=dict(x="Model", y="Defect Type", color="Defect Rate (%)"),
-                title=f"Defect Distribution Heatmap by Model ({selected_subcon})",
-                color_continuous_scale="Oranges",
-                width=1400,  # Tăng chiều rộng
-                height=900   # Tăng chiều cao
-            )
-
-            # Cập nhật tooltip để hiển thị chính xác số liệu
-            fig_heatmap.update_traces(
-                hovertemplate="<b>Model: %{x}</b><br>Defect Type: %{y}<br>Defect Rate: %{z:.2f}%<extra></extra>"
-            )
-
-            # Điều chỉnh font chữ để dễ đọc hơn
-            fig_heatmap.update_layout(
-                xaxis=dict(tickangle=45, title_font=dict(size=14), tickfont=dict(size=12)),  # Xoay label model, tăng font
-                yaxis=dict(title_font=dict(size=14), tickfont=dict(size=12)),  # Tăng font của defect type
-                margin=dict(l=100, r=100, t=80, b=100)  # Giữ khoảng cách để không bị cắt
-            )
-
-            st.plotly_chart(fig_heatmap, use_container_width=False)  # Tắt "use_container_width" để giữ kích thước cố định
-
-
-def render_osc(file_path, selected_category):
-    # Đọc dữ liệu từ file CSV
-    df_csv = pd.read_csv(file_path, encoding="utf-8")
-
-    # Chuẩn hóa dữ liệu
-    df_csv.fillna(0, inplace=True)
-    df_csv.columns = df_csv.columns.str.strip()
-
-    # Chuyển đổi kiểu dữ liệu số
-    numeric_columns = ["Year", "Month", "Week", "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty"]
-    for col in numeric_columns:
-        df_csv[col] = pd.to_numeric(df_csv[col], errors='coerce').fillna(0).astype(int)
-
-    # Xác định cột defect (bỏ qua các cột thông tin chung)
-    exclude_columns = ["Year", "Month", "Week", "Date", "Supplier", "Part", "Process", "Model", "PGSC", "Po", "Input Qty", "Inspection Qty", "Pass Qty",
-                "Reject Qty", "Reject %", "Result", "Remark"]
-    defect_columns = [col for col in df_csv.columns if col not in exclude_columns]
+    if isinstance(fig_heatmap, str):
+        st.warning(fig_heatmap)
+        return
+
+    st.plotly_chart(fig_heatmap, use_container_width=False)  # Tắt "use_container_width" để giữ kích thước cố định
+
+
+@st.fragment
+def render_sections(source_name, selection, year_key, week_key, selected_subcon, selected_week):
+    # Fragment: chuyển tab chỉ chạy lại phần biểu đồ (bộ lọc ở sidebar vẫn chạy lại cả trang)
+    # on_change="rerun": tab đang mở được lưu trong session state, các tab khác không chạy gì
+    monthly_tab, weekly_tab, models_tab, pareto_tab, pie_tab, heatmap_tab = st.tabs(SECTIONS, key="section",
+                                                                                    on_change="rerun")
+    # Khi chỉ fragment chạy lại (chuyển tab), thời gian các phần được ghi thành một lần chạy riêng
+    own_run = profiling.begin_run("Defect Tracking (tabs)", session_id())
+    try:
+        if monthly_tab.open:
+            with monthly_tab, profiling.stage("section: monthly trend"):
+                render_monthly(year_key, selection, selected_subcon)
+        if weekly_tab.open:
+            with weekly_tab:
+                with profiling.stage("section: weekly trend"):
+                    render_weekly(year_key, week_key, selection, selected_subcon, selected_week)
+                breakdown = SOURCES[source_name]["weekly_breakdown"]
+                if breakdown is not None:
+                    with profiling.stage(f"section: weekly by {breakdown}"):
+                        render_weekly_breakdown(week_key, selection, breakdown, selected_subcon, selected_week)
+        if models_tab.open:
+            with models_tab, profiling.stage("section: top models"):
+                render_top_models(week_key, selection, selected_subcon, selected_week)
+        if pareto_tab.open:
+            with pareto_tab, profiling.stage("section: defect pareto"):
+                render_pareto(week_key, selection, selected_subcon, selected_week)
+        if pie_tab.open:
+            with pie_tab, profiling.stage("section: defect distribution"):
+                render_pie(week_key, selection, selected_subcon)
+        if heatmap_tab.open:
+            with heatmap_tab, profiling.stage("section: heatmap"):
+                render_heatmap(week_key, selection, selected_subcon)
+    finally:
+        if own_run:
+            profiling.end_run()
+
+
+def render_tracking(source_name, selected_category):
+    # Trang tracking dùng chung cho mọi Production Type; khác biệt giữa các nguồn (measure, tỷ lệ Return,
+    # biểu đồ theo Process, ...) lấy từ cấu hình SOURCES của nguồn trong utils.data_loader.
+    # Các bảng tổng hợp của biểu đồ lấy từ nguồn truy vấn của backend (SUBCON_BACKEND, xem utils.queries):
+    # cube tổng hợp trong bộ nhớ hoặc SQL trên file SQLite.
+    # Dữ liệu chỉ đọc, dùng chung cho mọi phiên (build một lần cho mỗi phiên bản dữ liệu)
+    with profiling.stage("load tracking data"):
+        version, source = tracking_data(source_name)
 
     # Xác định danh sách SUBCON từ dữ liệu
-    subcon_list = sorted(df_csv["Supplier"].unique())
+    subcon_list = source.options("Supplier")
     selected_subcon = st.sidebar.selectbox("🏭 Select Subcon", ["All"] + subcon_list, index=0, key="subcon")
 
     # Nếu chưa chọn Subcon thì dừng chương trình
     if selected_subcon == "All":
+        with profiling.stage("bulk report panel"):
+            render_bulk_report(source_name, source)
         st.warning("Please select a Subcon to continue.")
         st.stop()
 
     # Bộ lọc Năm
-    year_options = sorted(df_csv["Year"].unique())
+    year_options = source.options("Year")
     selected_year = st.sidebar.selectbox("📅 Select Year", ["All"] + [str(y) for y in year_options], key="year")
-    
+
     # Nếu chưa chọn Year thì dừng chương trình
     if selected_year == "All":
         st.warning("Please select a Year to continue.")
         st.stop()
 
     # Bộ lọc Tuần
-    week_options = sorted(df_csv["Week"].unique())
+    week_options = source.options("Week")
     selected_week = st.sidebar.selectbox("📅 Select Week", ["All"] + [str(w) for w in week_options], key="week")
 
-    # Lọc dữ liệu theo các bộ lọc đã chọn
-    df_filtered = df_csv.copy()
-
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    if selected_year != "All":
-        df_filtered = df_filtered[df_filtered["Year"] == int(selected_year)]
+    # Key cache kết quả các phần theo bộ lọc: các phần theo cả năm không phụ thuộc tuần đã chọn
+    week = int(selected_week) if selected_week != "All" else None
+    year_key = (source_name, version, selected_subcon, int(selected_year))
+    week_key = year_key + (week,)
 
-    if selected_week != "All":
-        df_filtered = df_filtered[df_filtered["Week"] == int(selected_week)]
+    # Lát cắt chỉ được truy vấn khi một phần đang mở chưa có kết quả trong cache
+    selection = source.select(selected_subcon, int(selected_year), week)
 
     # Hiển thị tiêu đề
     st.markdown(f"<h1 style='text-align: center;'>📌 {selected_category} - Subcon Tracking</h1>", unsafe_allow_html=True)
 
-    st.markdown("### 📥 Export Filtered Data")
-    col1, col2, col3 = st.columns([1, 1, 1])  # Chia thành 3 cột để giao diện nhỏ gọn
-
-    with col1:
-        export_year = st.selectbox("📅 Year", ["All"] + sorted(df_csv["Year"].unique().astype(str)), key="export_year")
-    with col2:
-        export_week = st.selectbox("📅 Week", ["All"] + sorted(df_csv["Week"].unique().astype(str)), key="export_week")
-    with col3:
-        st.write("")  # Khoảng trống để căn nút nằm thẳng hàng
-        generate_btn = st.button("Generate Excel", key="generate_excel")
-
-    if generate_btn:
-        # Lọc dữ liệu theo năm và tuần đã chọn
-        df_export = df_csv.copy()
-        if export_year != "All":
-            df_export = df_export[df_export["Year"] == int(export_year)]
-        if export_week != "All":
-            df_export = df_export[df_export["Week"] == int(export_week)]
-        if selected_subcon != "All":
-            df_export = df_export[df_export["Supplier"] == selected_subcon]
-
-        # Kiểm tra nếu không có dữ liệu
-        if df_export.empty:
-            st.warning("⚠️ No data available for the selected filters.")
-        else:
-            # Tạo file Excel từ dữ liệu đã lọc
-            def convert_to_excel(dataframe):
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    dataframe.to_excel(writer, index=False, sheet_name='Filtered Data')
-                    writer.close()
-                return output.getvalue()
-
-            excel_data = convert_to_excel(df_export)
-
-            # Nút tải xuống file Excel
-            st.download_button(
-                label="📥 Download Filtered Excel",
-                data=excel_data,
-                file_name=f"{selected_subcon}_Year{export_year}_Week{export_week}.xlsx",
-                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-
-
-    # --- 1️⃣ Monthly Trend ---
-    st.subheader("1️⃣ Monthly Defect Trend")
-
-    # Lọc dữ liệu theo Production Type, Subcon và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tháng
-    df_monthly = df_filtered.groupby("Month").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-    }).reset_index()
-
-    
-    # Monthly Defect Rate
-    # Tính tỷ lệ lỗi (Reject Qty / Inspection Qty) * 100
-    df_monthly["Defect Rate (%)"] = (df_monthly["Reject Qty"] / df_monthly["Inspection Qty"]) * 100
-
-    # Xử lý lỗi chia cho 0 (nếu Inspection Qty = 0, gán 0%)
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].fillna(0)
-
-    # Làm tròn số liệu và chuyển thành dạng chuỗi có ký hiệu `%`
-    df_monthly["Defect Rate (%)"] = df_monthly["Defect Rate (%)"].round(2)  # Làm tròn đến 2 chữ số thập phân
-    df_monthly["Defect Rate Text"] = df_monthly["Defect Rate (%)"].astype(str) + "%"  # Thêm ký hiệu %
-
-    # Vẽ biểu đồ Monthly Defect Rate
-    fig_monthly = px.bar(
-        df_monthly, 
-        x="Month", 
-        y="Defect Rate (%)", 
-        text="Defect Rate Text",  # Hiển thị phần trăm trực tiếp trên cột
-        color_discrete_sequence=["#1f77b4"],  # Màu cố định cho tất cả các cột
-        title=f"Monthly Defect Rate ({selected_subcon})"
-    )
-
-    # Cập nhật trục y để hiển thị %
-    fig_monthly.update_yaxes(title_text="Defect Rate (%)")
-
-    # Chỉnh hover tooltip
-    fig_monthly.update_traces(
-        hovertemplate="<b>Month: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-    )
-
-    fig_monthly.update_xaxes(
-        title_text="Month",
-        tickmode="linear",  # Hiển thị tất cả các giá trị số
-        tickvals=list(range(1, 13)),  # Đảm bảo hiện từ tháng 1 đến tháng 12
-        tickformat="d",  # Định dạng số nguyên
-        tickangle=0  # Giữ thẳng hàng dễ đọc
-    )
-
-    st.plotly_chart(fig_monthly, use_container_width=True)
-    
-
-    # --- 2️⃣ Weekly Defect Trend ---
-    st.subheader("2️⃣ Weekly Defect Trend")
-
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_filtered = df_csv[df_csv["Year"] == int(selected_year)]
+    with profiling.stage("export panel"):
+        render_export(source_name, selected_subcon, year_options, week_options)
 
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_filtered = df_filtered[df_filtered["Supplier"] == selected_subcon]
-
-    # Tính tổng số lượng kiểm tra & reject theo tuần
-    df_weekly = df_filtered.groupby("Week").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-    }).reset_index()
-
-    # Tính toán Defect Rate (%) cho từng tuần
-    df_weekly["Defect Rate (%)"] = (df_weekly["Reject Qty"] / df_weekly["Inspection Qty"]) * 100
-    df_weekly["Defect Rate (%)"] = df_weekly["Defect Rate (%)"].fillna(0).round(2)
-    df_weekly["Defect Rate Text"] = df_weekly["Defect Rate (%)"].astype(str) + "%"
-
-    # Nếu chọn "All" tuần → vẽ Line Chart
-    if selected_week == "All":
-        fig_weekly = px.line(
-            df_weekly, x="Week", y="Defect Rate (%)",
-            markers=True, title=f"Weekly Defect Trend ({selected_subcon})"
-        )
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-    else:
-        # Lọc dữ liệu chỉ cho tuần đã chọn
-        df_week_selected = df_weekly[df_weekly["Week"] == int(selected_week)]
-
-        # Vẽ Bar Chart cho tuần được chọn
-        fig_weekly = px.bar(
-            df_week_selected, x="Week", y="Defect Rate (%)",
-            text="Defect Rate Text", 
-            title=f"Defect Rate for Week {selected_week} ({selected_subcon})"
-        )
-
-        # **Chỉ hiển thị đúng số tuần đã chọn**
-        fig_weekly.update_xaxes(
-            tickmode="array",
-            tickvals=[int(selected_week)],  # Chỉ hiển thị đúng tuần đã chọn
-            ticktext=[f"{selected_week}"]
-        )
-
-        fig_weekly.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-    # Cập nhật trục y hiển thị %
-    fig_weekly.update_yaxes(title_text="Defect Rate (%)")
-
-    st.plotly_chart(fig_weekly, use_container_width=True)
-
-
-    # Weekly by Process
-    # Lọc dữ liệu theo Year và Subcon đã chọn
-    df_outsourcing = df_csv[df_csv["Year"] == int(selected_year)]
-
-    if selected_subcon != "All":
-        df_outsourcing = df_outsourcing[df_outsourcing["Supplier"] == selected_subcon]
-
-    # Nếu chọn "All" tuần → vẽ Line Chart
-    if selected_week == "All":
-
-        # Tính tổng số lượng kiểm tra & reject theo Process và Week
-        df_week_process_line = df_outsourcing.groupby(["Week", "Process"]).agg({
-            "Reject Qty": "sum",
-            "Inspection Qty": "sum"
-        }).reset_index()
-
-        # Tính toán Defect Rate (%)
-        df_week_process_line["Defect Rate (%)"] = (df_week_process_line["Reject Qty"] / df_week_process_line["Inspection Qty"]) * 100
-        df_week_process_line["Defect Rate (%)"] = df_week_process_line["Defect Rate (%)"].fillna(0).round(2)
-
-        # Vẽ Line Chart cho từng Process
-        fig_line = px.line(
-            df_week_process_line, x="Week", y="Defect Rate (%)",
-            color="Process",  # Mỗi Process là một đường khác nhau
-            markers=True,
-            title= f"Defect Rate for Week {selected_week} ({selected_subcon})"
-        )
-
-        fig_line.update_traces(
-            hovertemplate="<b>Week: %{x}</b><br>Process: %{legendgroup}<br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-        fig_line.update_yaxes(title_text="Defect Rate (%)")
-        fig_line.update_xaxes(title_text="Week")
-
-        st.plotly_chart(fig_line, use_container_width=True)
-
-    else:
-        # Lọc dữ liệu chỉ cho tuần đã chọn
-        df_selected_week = df_outsourcing[df_outsourcing["Week"] == int(selected_week)]
-
-        # Tính tổng số lượng kiểm tra & reject theo Process
-        df_week_process_column = df_selected_week.groupby("Process").agg({
-            "Reject Qty": "sum",
-            "Inspection Qty": "sum"
-        }).reset_index()
-
-        # Tính toán Defect Rate (%)
-        df_week_process_column["Defect Rate (%)"] = (df_week_process_column["Reject Qty"] / df_week_process_column["Inspection Qty"]) * 100
-        df_week_process_column["Defect Rate (%)"] = df_week_process_column["Defect Rate (%)"].fillna(0).round(2)
-        df_week_process_column["Defect Rate Text"] = df_week_process_column["Defect Rate (%)"].astype(str) + "%"
-
-        # Vẽ Column Chart cho Process
-        fig_column = px.bar(
-            df_week_process_column,
-            x="Process", y="Defect Rate (%)",
-            text="Defect Rate Text",  # Hiển thị tỷ lệ lỗi trực tiếp trên cột
-            color="Process",  # Mỗi Process có màu riêng
-            title=f"Defect Rate for Week {selected_week} ({selected_subcon})"
-        )
-
-        fig_column.update_traces(
-            hovertemplate="<b>Process: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-        fig_column.update_yaxes(title_text="Defect Rate (%)")
-        fig_column.update_xaxes(title_text="Process")
-
-        # Hiển thị biểu đồ
-        st.plotly_chart(fig_column, use_container_width=True)
-
-
-    # --- 3️⃣ Biểu đồ Top Model có defect cao nhất ---
-    st.subheader("3️⃣ Top Models")
-
-    # Lọc dữ liệu theo Production Type, Subcon, và Year
-    df_top_models = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_top_models = df_top_models[df_top_models["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_top_models = df_top_models[df_top_models["Week"] == int(selected_week)]
-
-    # Tính tỷ lệ defect cho từng model
-    df_top_models = df_top_models.groupby("Model").agg({
-        "Reject Qty": "sum",
-        "Inspection Qty": "sum",
-    }).reset_index()
-
-    # Defect Rate
-    # Tính toán defect rate (%)
-    df_top_models["Defect Rate (%)"] = (df_top_models["Reject Qty"] / df_top_models["Inspection Qty"]) * 100
-    df_top_models["Defect Rate (%)"] = df_top_models["Defect Rate (%)"].fillna(0).round(2)
-    df_top_models["Defect Rate Text"] = df_top_models["Defect Rate (%)"].astype(str) + "%"
-
-    # Chọn Top Model có defect rate cao nhất
-    df_top_models = df_top_models.sort_values("Defect Rate (%)", ascending=False).head(3)
-
-    # Kiểm tra nếu có dữ liệu hay không
-    if df_top_models.empty:
-        st.warning("⚠️ Không có dữ liệu defect cho Model trong bộ lọc này.")
-    else:
-        # Vẽ biểu đồ
-        fig_models = px.bar(
-            df_top_models, 
-            x="Model", 
-            y="Defect Rate (%)", 
-            text="Defect Rate Text", 
-            color="Model",
-            title=f"Top Models with Highest Defect Rate ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})"
-        )
-
-        # Cập nhật trục y để hiển thị %
-        fig_models.update_yaxes(title_text="Defect Rate (%)")
-
-        # Chỉnh hover tooltip
-        fig_models.update_traces(
-            hovertemplate="<b>Model: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
-        )
-
-        st.plotly_chart(fig_models, use_container_width=True)
-
-
-    # --- 4️⃣ Biểu đồ Pareto Chart - Defect Analysis ---
-    st.subheader("4️⃣ Defect Analysis")
-
-    # Lọc dữ liệu theo Year
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
-
-    # Đảm bảo kiểu dữ liệu số
-    df_defect_types["Defect Count"] = pd.to_numeric(df_defect_types["Defect Count"], errors='coerce').fillna(0).astype(int)
-
-    # Sắp xếp lỗi theo số lượng từ cao đến thấp
-    df_defect_types = df_defect_types[df_defect_types["Defect Count"] > 0].sort_values("Defect Count", ascending=False)
-
-    # Kiểm tra nếu không có defect nào
-    if df_defect_types.empty:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Đảm bảo cột "Defect Type" là chuỗi
-        df_defect_types["Defect Type"] = df_defect_types["Defect Type"].astype(str)
-
-        # Tính toán tỷ lệ lũy kế (Cumulative %)
-        df_defect_types["Cumulative %"] = df_defect_types["Defect Count"].cumsum() / float(df_defect_types["Defect Count"].sum()) * 100
-
-        # Vẽ biểu đồ Pareto
-        fig_pareto = go.Figure()
-
-        # Cột Defect Count (trục y bên trái)
-        fig_pareto.add_trace(go.Bar(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Defect Count"], 
-            name="Defect Count",
-            marker=dict(color="royalblue"),
-            hovertemplate="<b>Defect Type: %{x}</b><br>Defect Count: %{y}<extra></extra>"
-        ))
-
-        # Đường Cumulative % (trục y bên phải)
-        fig_pareto.add_trace(go.Scatter(
-            x=df_defect_types["Defect Type"], 
-            y=df_defect_types["Cumulative %"],
-            mode="lines+markers",
-            name="Cumulative Percentage",
-            yaxis="y2",
-            hovertemplate="<b>Defect Type: %{x}</b><br>Cumulative %: %{y:.2f}%<extra></extra>"
-        ))
-
-        # Cấu hình trục
-        fig_pareto.update_layout(
-            title=f"Pareto Chart - Defect Types ({selected_subcon} - {'Week ' + selected_week if selected_week != 'All' else 'All Weeks'})",
-            xaxis=dict(title="Defect Type"),
-            yaxis=dict(title="Defect Count", side="left"),
-            yaxis2=dict(
-                title="Cumulative Percentage (%)",
-                overlaying="y",
-                side="right",
-                showgrid=False
-            ),
-            legend=dict(x=1.1, y=1),
-        )
-
-        st.plotly_chart(fig_pareto, use_container_width=True)
-
-
-    # --- 5️⃣ Biểu đồ Pie Chart - Defect Distribution by Defect Type ---
-    st.subheader("5️⃣ Defect Distribution by Defect Type")
-
-    # Lọc dữ liệu theo năm
-    df_defect = df_csv[df_csv["Year"] == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_defect = df_defect[df_defect["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_defect = df_defect[df_defect["Week"] == int(selected_week)]
-
-    # Tổng hợp số lượng của từng defect type
-    df_defect_types = df_defect[defect_columns].sum().reset_index()
-    df_defect_types.columns = ["Defect Type", "Defect Count"]
-
-    # Chuyển đổi kiểu dữ liệu sang float
-    df_defect_types["Defect Count"] = pd.to_numeric(df_defect_types["Defect Count"], errors="coerce").fillna(0).astype(float)
-
-    # Kiểm tra nếu không có defect nào
-    if df_defect_types["Defect Count"].sum() == 0:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Tính tổng số lượng lỗi
-        total_defects = df_defect_types["Defect Count"].sum()
-
-        # Tính tỷ lệ % lỗi
-        df_defect_types["Defect Percentage"] = (df_defect_types["Defect Count"] / total_defects) * 100
-        df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].fillna(0).round(2)
-
-        # Vẽ biểu đồ Pie Chart
-        fig_pie = px.pie(
-            df_defect_types, 
-            names="Defect Type", 
-            values="Defect Percentage",
-            title=f"Defect Distribution for Subcon: {selected_subcon}",
-            hole=0.3
-        )
-
-        # Cập nhật tooltip
-        fig_pie.update_traces(
-            hovertemplate="<b>Defect Type: %{label}</b><br>Defect Percentage: %{value:.2f}%<extra></extra>"
-        )
-
-        st.plotly_chart(fig_pie, use_container_width=True)
-
-
-    # --- 6️⃣ Biểu đồ Heatmap Defect Distribution by Model ---
-    st.subheader("6️⃣ Defect Distribution Heatmap by Model")
-
-    # Lọc dữ liệu theo năm
-    df_heatmap = df_csv[df_csv["Year"].astype(int) == int(selected_year)]
-
-    # Nếu subcon không phải "All", lọc theo subcon cụ thể
-    if selected_subcon != "All":
-        df_heatmap = df_heatmap[df_heatmap["Supplier"] == selected_subcon]
-
-    # Nếu chọn tuần cụ thể, lọc theo tuần
-    if selected_week != "All":
-        df_heatmap = df_heatmap[df_heatmap["Week"].astype(int) == int(selected_week)]
-
-    # Kiểm tra nếu không có dữ liệu
-    if df_heatmap.empty or len(defect_columns) == 0:
-        st.warning("⚠️ Không có dữ liệu defect nào cho bộ lọc này.")
-    else:
-        # Chuyển đổi tất cả các cột defect về dạng số
-        df_heatmap[defect_columns] = df_heatmap[defect_columns].apply(pd.to_numeric, errors="coerce").fillna(0)
-        # Đảm bảo Model luôn là chuỗi
-        df_heatmap["Model"] = df_heatmap["Model"].astype(str)
-
-        # Tổng số lỗi của từng Model theo loại lỗi
-        df_defect_counts = df_heatmap.groupby("Model")[defect_columns].sum().reset_index()
-        
-        # Tổng số lượng kiểm của từng Model
-        df_total_inspection = df_heatmap.groupby("Model")["Inspection Qty"].sum().reset_index()
-
-        # Chuyển đổi dữ liệu về dạng số để tránh lỗi chia cho chuỗi
-        df_total_inspection["Inspection Qty"] = df_total_inspection["Inspection Qty"].astype(float)
-
-        # Chuyển đổi dữ liệu sang dạng cột để vẽ heatmap
-        df_heatmap_melted = df_defect_counts.melt(id_vars=["Model"], var_name="Defect Type", value_name="Defect Count")
-
-        # **🛠️ Khắc phục lỗi `Model` đã tồn tại khi `merge`**
-        df_total_inspection = df_total_inspection.rename(columns={"Model": "Model_TEMP"})  # Đổi tên cột tạm thời
-        df_heatmap_melted = df_heatmap_melted.merge(df_total_inspection, left_on="Model", right_on="Model_TEMP", how="left")
-        df_heatmap_melted.drop(columns=["Model_TEMP"], inplace=True)  # Xóa cột tạm
-
-        # Chuyển đổi tất cả các giá trị sang số
-        df_heatmap_melted["Defect Count"] = df_heatmap_melted["Defect Count"].astype(float)
-        df_heatmap_melted["Inspection Qty"] = df_heatmap_melted["Inspection Qty"].astype(float)
-
-        # Kiểm tra nếu Inspection Qty = 0 thì đặt tỷ lệ lỗi = 0
-        df_heatmap_melted["Defect Rate (%)"] = df_heatmap_melted.apply(
-            lambda row: (row["Defect Count"] / row["Inspection Qty"]) * 100 if row["Inspection Qty"] > 0 else 0,
-            axis=1
-        ).round(2)
-
-        # Loại bỏ các lỗi có giá trị 0 để không hiển thị trên heatmap
-        df_heatmap_melted = df_heatmap_melted[df_heatmap_melted["Defect Rate (%)"] > 0]
-
-        
-
-        if df_heatmap_melted.empty:
-            st.warning("⚠️ Không có dữ liệu đủ lớn để hiển thị heatmap.")
-        else:
-            # Vẽ Heatmap với màu đỏ cam, điều chỉnh kích thước rộng hơn
-            fig_heatmap = px.imshow(
-                df_heatmap_melted.pivot(index="Defect Type", columns="Model", values="Defect Rate (%)"),
-                labels=dict(x="Model", y="Defect Type", color="Defect Rate (%)"),
-                title=f"Defect Distribution Heatmap by Model ({selected_subcon})",
-                color_continuous_scale="Oranges",
-                width=1400,  # Tăng chiều rộng
-                height=900   # Tăng chiều cao
-            )
-
-            # Cập nhật tooltip để hiển thị chính xác số liệu
-            fig_heatmap.update_traces(
-                hovertemplate="<b>Model: %{x}</b><br>Defect Type: %{y}<br>Defect Rate: %{z:.2f}%<extra></extra>"
-            )
-
-            # Điều chỉnh font chữ để dễ đọc hơn
-            fig_heatmap.update_layout(
-                xaxis=dict(tickangle=45, title_font=dict(size=14), tickfont=dict(size=12)),  # Xoay label model, tăng font
-                yaxis=dict(title_font=dict(size=14), tickfont=dict(size=12)),  # Tăng font của defect type
-                margin=dict(l=100, r=100, t=80, b=100)  # Giữ khoảng cách để không bị cắt
-            )
-
-            st.plotly_chart(fig_heatmap, use_container_width=False)  # Tắt "use_container_width" để giữ kích thước cố định
+    render_sections(source_name, selection, year_key, week_key, selected_subcon, selected_week)
 
 
+# SUBCON_PROFILE=1|memory: ghi thời gian từng bước của lần chạy này (utils.profiling), hiện bảng trong sidebar
+profiling.begin_run("Defect Tracking", session_id())
 try:
-    if selected_category == "Upper":
-        render_upper(file_path, selected_category)
-    if selected_category == "Bottom":
-        render_bottom(file_path, selected_category)
-    if selected_category == "Outsourcing":
-        render_osc(file_path, selected_category)
+    render_tracking(source_name, selected_category)
 
 except FileNotFoundError:
     st.error(f"⚠️ Không tìm thấy dữ liệu!")
 except Exception as e:
     st.error(f"⚠️ Lỗi hệ thống! {e}")
+finally:
+    # Chạy cả khi st.stop() dừng trang giữa chừng
+    profiling.debug_panel(profiling.end_run())
@@ -0,0 +1,304 @@
+import plotly.express as px
+import plotly.graph_objects as go
+
+from utils import kpi
+
+# Các hàm dựng figure Plotly cho trang Home và Defect Tracking từ các bảng đã tổng hợp (không phụ thuộc Streamlit
+# hay backend dữ liệu, dùng được cả trong benchmark); trang chỉ cache và hiển thị figure trả về.
+
+
+def rate_label(rate):
+    # "Defect Rate (%)" -> "Defect Rate"
+    return rate.replace(" (%)", "")
+
+
+def with_rate_text(table):
+    # Thêm cột "<tỷ lệ> Text" (giá trị kèm ký hiệu %) cho mỗi tỷ lệ (%) có trong bảng, để hiển thị trên cột
+    for rate in kpi.RATES:
+        if rate in table.columns:
+            table[f"{rate_label(rate)} Text"] = table[rate].astype(str) + "%"
+    return table
+
+
+def monthly_figure(df_monthly, rate, selected_subcon):
+    label = rate_label(rate)
+
+    # Vẽ biểu đồ Monthly Rate
+    fig_monthly = px.bar(
+        df_monthly,
+        x="Month",
+        y=rate,
+        text=f"{label} Text",  # Hiển thị phần trăm trực tiếp trên cột
+        color_discrete_sequence=["#1f77b4"],  # Màu cố định cho tất cả các cột
+        title=f"Monthly {label} ({selected_subcon})"
+    )
+
+    # Cập nhật trục y để hiển thị %
+    fig_monthly.update_yaxes(title_text=rate)
+
+    # Chỉnh hover tooltip
+    fig_monthly.update_traces(
+        hovertemplate=f"<b>Month: %{{x}}</b><br>{label}: %{{y:.2f}}%<extra></extra>"
+    )
+
+    fig_monthly.update_xaxes(
+        title_text="Month",
+        tickmode="linear",  # Hiển thị tất cả các giá trị số
+        tickvals=list(range(1, 13)),  # Đảm bảo hiện từ tháng 1 đến tháng 12
+        tickformat="d",  # Định dạng số nguyên
+        tickangle=0  # Giữ thẳng hàng dễ đọc
+    )
+    return fig_monthly
+
+
+def weekly_figure(df_weekly, rate, selected_subcon, selected_week):
+    label = rate_label(rate)
+
+    # Nếu chọn "All" tuần → vẽ Line Chart (WebGL)
+    if selected_week == "All":
+        fig_weekly = px.line(
+            df_weekly, x="Week", y=rate,
+            markers=True, render_mode="webgl", title=f"Weekly {label.split()[0]} Trend ({selected_subcon})"
+        )
+        fig_weekly.update_traces(
+            hovertemplate=f"<b>Week: %{{x}}</b><br>{label}: %{{y:.2f}}%<extra></extra>"
+        )
+    else:
+        # Lọc dữ liệu chỉ cho tuần đã chọn
+        df_week_selected = df_weekly[df_weekly["Week"] == int(selected_week)]
+
+        # Vẽ Bar Chart cho tuần được chọn
+        fig_weekly = px.bar(
+            df_week_selected, x="Week", y=rate,
+            text=f"{label} Text",
+            title=f"{label} for Week {selected_week} ({selected_subcon})"
+        )
+
+        # **Chỉ hiển thị đúng số tuần đã chọn**
+        fig_weekly.update_xaxes(
+            tickmode="array",
+            tickvals=[int(selected_week)],  # Chỉ hiển thị đúng tuần đã chọn
+            ticktext=[f"{selected_week}"]
+        )
+
+        fig_weekly.update_traces(
+            hovertemplate=f"<b>Week: %{{x}}</b><br>{label}: %{{y:.2f}}%<extra></extra>"
+        )
+
+    # Cập nhật trục y hiển thị %
+    fig_weekly.update_yaxes(title_text=rate)
+    return fig_weekly
+
+
+def breakdown_by(breakdown, selected_week):
+    # Các cột nhóm của bảng tỷ lệ cho biểu đồ theo nhóm: theo Week và nhóm khi chọn "All" tuần, ngược lại chỉ theo nhóm
+    return ["Week", breakdown] if selected_week == "All" else breakdown
+
+
+def weekly_breakdown_figure(table, breakdown, selected_subcon, selected_week):
+    # Defect Rate theo tuần của từng nhóm (vd. Process của OSC); table là bảng tỷ lệ theo breakdown_by(...)
+    # của dữ liệu cả năm khi chọn "All" tuần, ngược lại của tuần đã chọn
+    # Nếu chọn "All" tuần → vẽ Line Chart (WebGL)
+    if selected_week == "All":
+
+        # Vẽ Line Chart cho từng nhóm
+        fig_line = px.line(
+            table, x="Week", y="Defect Rate (%)",
+            color=breakdown,  # Mỗi nhóm là một đường khác nhau
+            markers=True,
+            render_mode="webgl",
+            title= f"Defect Rate for Week {selected_week} ({selected_subcon})"
+        )
+
+        fig_line.update_traces(
+            hovertemplate=f"<b>Week: %{{x}}</b><br>{breakdown}: %{{legendgroup}}<br>Defect Rate: %{{y:.2f}}%<extra></extra>"
+        )
+
+        fig_line.update_yaxes(title_text="Defect Rate (%)")
+        fig_line.update_xaxes(title_text="Week")
+        return fig_line
+
+    # Tổng số lượng kiểm tra & reject và Defect Rate (%) theo nhóm trong tuần đã chọn
+    df_week_column = with_rate_text(table)
+
+    # Vẽ Column Chart cho từng nhóm
+    fig_column = px.bar(
+        df_week_column,
+        x=breakdown, y="Defect Rate (%)",
+        text="Defect Rate Text",  # Hiển thị tỷ lệ lỗi trực tiếp trên cột
+        color=breakdown,  # Mỗi nhóm có màu riêng
+        title=f"Defect Rate for Week {selected_week} ({selected_subcon})"
+    )
+
+    fig_column.update_traces(
+        hovertemplate=f"<b>{breakdown}: %{{x}}</b><br>Defect Rate: %{{y:.2f}}%<extra></extra>"
+    )
+
+    fig_column.update_yaxes(title_text="Defect Rate (%)")
+    fig_column.update_xaxes(title_text=breakdown)
+    return fig_column
+
+
+def week_label(selected_week):
+    return "Week " + selected_week if selected_week != "All" else "All Weeks"
+
+
+def top_models_figure(df_top_models, selected_subcon, selected_week):
+    # Các Model có defect rate cao nhất (kpi.top_models); None nếu không có dữ liệu
+    df_top_models = with_rate_text(df_top_models)
+    if df_top_models.empty:
+        return None
+
+    # Vẽ biểu đồ
+    fig_models = px.bar(
+        df_top_models,
+        x="Model",
+        y="Defect Rate (%)",
+        text="Defect Rate Text",
+        color="Model",
+        title=f"Top Models with Highest Defect Rate ({selected_subcon} - {week_label(selected_week)})"
+    )
+
+    # Cập nhật trục y để hiển thị %
+    fig_models.update_yaxes(title_text="Defect Rate (%)")
+
+    # Chỉnh hover tooltip
+    fig_models.update_traces(
+        hovertemplate="<b>Model: %{x}</b><br>Defect Rate: %{y:.2f}%<extra></extra>"
+    )
+    return fig_models
+
+
+def pareto_figure(totals, selected_subcon, selected_week):
+    # Tổng số lượng của từng defect type (chỉ lỗi > 0, giảm dần) kèm tỷ lệ lũy kế (Cumulative %);
+    # totals là tổng số lỗi theo loại lỗi (Series); None nếu không có defect nào
+    df_defect_types = kpi.defect_pareto(totals)
+    if df_defect_types.empty:
+        return None
+
+    # Vẽ biểu đồ Pareto
+    fig_pareto = go.Figure()
+
+    # Cột Defect Count (trục y bên trái)
+    fig_pareto.add_trace(go.Bar(
+        x=df_defect_types["Defect Type"],
+        y=df_defect_types["Defect Count"],
+        name="Defect Count",
+        marker=dict(color="royalblue"),
+        hovertemplate="<b>Defect Type: %{x}</b><br>Defect Count: %{y}<extra></extra>"
+    ))
+
+    # Đường Cumulative % (trục y bên phải)
+    fig_pareto.add_trace(go.Scatter(
+        x=df_defect_types["Defect Type"],
+        y=df_defect_types["Cumulative %"],
+        mode="lines+markers",
+        name="Cumulative Percentage",
+        yaxis="y2",
+        hovertemplate="<b>Defect Type: %{x}</b><br>Cumulative %: %{y:.2f}%<extra></extra>"
+    ))
+
+    # Cấu hình trục
+    fig_pareto.update_layout(
+        title=f"Pareto Chart - Defect Types ({selected_subcon} - {week_label(selected_week)})",
+        xaxis=dict(title="Defect Type"),
+        yaxis=dict(title="Defect Count", side="left"),
+        yaxis2=dict(
+            title="Cumulative Percentage (%)",
+            overlaying="y",
+            side="right",
+            showgrid=False
+        ),
+        legend=dict(x=1.1, y=1),
+    )
+    return fig_pareto
+
+
+def pie_figure(totals, selected_subcon):
+    # Tỷ lệ % của từng defect type trên tổng số lỗi (bỏ các lỗi 0%, làm tròn 2 chữ số); None nếu không có defect nào
+    df_defect_types = kpi.defect_shares(totals)
+    if df_defect_types.empty:
+        return None
+
+    # Vẽ biểu đồ Pie Chart
+    fig_pie = px.pie(
+        df_defect_types,
+        names="Defect Type",
+        values="Defect Percentage",
+        title=f"Defect Distribution for Subcon: {selected_subcon}",
+        hole=0.3,  # Tạo dạng Doughnut Chart
+    )
+
+    # Cập nhật tooltip
+    fig_pie.update_traces(
+        hovertemplate="<b>Defect Type: %{label}</b><br>Defect Percentage: %{value:.2f}%<extra></extra>"
+    )
+    return fig_pie
+
+
+def heatmap_figure(df_defect_rates, selected_subcon):
+    # Heatmap tỷ lệ lỗi (%) theo loại lỗi x Model từ ma trận tỷ lệ lỗi (defects.rate_matrix; None nếu bộ lọc
+    # không có dòng nào hoặc nguồn không có cột defect); chuỗi cảnh báo thay cho biểu đồ nếu không có dữ liệu
+    if df_defect_rates is None:
+        return "⚠️ Không có dữ liệu defect nào cho bộ lọc này."
+
+    if df_defect_rates.empty:
+        return "⚠️ Không có dữ liệu đủ lớn để hiển thị heatmap."
+
+    # Vẽ Heatmap với màu đỏ cam, điều chỉnh kích thước rộng hơn.
+    # Giá trị đã làm tròn 2 chữ số nên gửi dạng float32 (mảng nhị phân nhỏ bằng một nửa float64)
+    fig_heatmap = px.imshow(
+        df_defect_rates.astype("float32"),
+        labels=dict(x="Model", y="Defect Type", color="Defect Rate (%)"),
+        title=f"Defect Distribution Heatmap by Model ({selected_subcon})",
+        color_continuous_scale="Oranges",
+        width=1400,  # Tăng chiều rộng
+        height=900   # Tăng chiều cao
+    )
+
+    # Cập nhật tooltip để hiển thị chính xác số liệu
+    fig_heatmap.update_traces(
+        hovertemplate="<b>Model: %{x}</b><br>Defect Type: %{y}<br>Defect Rate: %{z:.2f}%<extra></extra>"
+    )
+
+    # Điều chỉnh font chữ để dễ đọc hơn
+    fig_heatmap.update_layout(
+        xaxis=dict(tickangle=45, title_font=dict(size=14), tickfont=dict(size=12)),  # Xoay label model, tăng font
+        yaxis=dict(title_font=dict(size=14), tickfont=dict(size=12)),  # Tăng font của defect type
+        margin=dict(l=100, r=100, t=80, b=100)  # Giữ khoảng cách để không bị cắt
+    )
+    return fig_heatmap
+
+
+def reject_rate_figure(summary):
+    # Biểu đồ % Reject theo Production Type của trang Home (summary: kpi.reject_summary)
+    chart_data = summary.reset_index()
+
+    fig = px.bar(
+        chart_data, 
+        x="Category", 
+        y="% Reject", 
+        color="Category", 
+        labels={"% Reject": "% Reject Rate"}, 
+        title="Reject % by Production Type",
+        text="% Reject",  # Thêm text vào từng cột
+        category_orders={"Category": ["Upper", "Bottom", "OSC"]}  # Giữ thứ tự cố định
+    )
+
+    fig.update_traces(
+        texttemplate="%{text:.2f}%",  # Hiển thị số với 2 chữ số thập phân
+        textposition="inside"  # Hiển thị số liệu bên trong cột
+    )
+
+    fig.update_layout(
+        title={
+            "text": "Reject % by Production Type",
+            "y": 0.95,  # Vị trí theo trục y (0.0 là đáy, 1.0 là đỉnh)
+            "x": 0.48,   # Căn giữa theo trục x
+            "xanchor": "center",
+            "yanchor": "top"
+        },
+        uniformtext_minsize=10, 
+        uniformtext_mode="hide"
+    )
+    return fig
@@ -0,0 +1,108 @@
+import threading
+
+import numpy as np
+
+from utils import profiling
+from utils.data_loader import SOURCES, data_version, defect_columns, pin_snapshot, read_columns, source_columns
+from utils.defects import DefectTable
+
+# Cache theo process: name -> (phiên bản dữ liệu, cube, bảng defect)
+_cache = {}
+_lock = threading.Lock()
+
+# Thứ tự dòng của cube, trùng với thứ tự của FilterIndex để index của lát cắt chính là row_id
+SORT_KEYS = ["Supplier", "Year", "Week"]
+
+# Số cột defect đọc mỗi lần khi build bảng defect (giới hạn bộ nhớ tạm)
+DEFECT_BATCH = 16
+
+# Số lần build lại khi snapshot đổi phiên bản giữa chừng
+BUILD_ATTEMPTS = 3
+
+
+def build_pinned(name, build, what):
+    # build(manifest) đọc mọi cột cần dùng từ cùng một manifest snapshot (pin_snapshot) để số dòng luôn khớp nhau,
+    # trả về None nếu các lần đọc không cùng số dòng (không có snapshot, file đổi giữa chừng).
+    # Nếu phiên bản đó bị thay giữa chừng (segment cũ bị xóa, hoặc số dòng khác) thì build lại
+    for _ in range(BUILD_ATTEMPTS):
+        try:
+            result = build(pin_snapshot(name))
+        except FileNotFoundError:
+            continue
+        if result is not None:
+            return result
+    raise RuntimeError(f"{name}: data changed during every {what} build attempt")
+
+
+def read_defects(name, manifest, row_ids):
+    # Bảng defect dạng dài của nguồn: đọc cột defect theo từng lô, chỉ giữ lại các ô khác 0.
+    # row_ids[i] là row_id đích của dòng i; None nếu số dòng đọc được khác len(row_ids)
+    columns = defect_columns(name, manifest["columns"] if manifest is not None else source_columns(name))
+    tables = []
+    for start in range(0, len(columns), DEFECT_BATCH):
+        batch = columns[start:start + DEFECT_BATCH]
+        values = read_columns(name, batch, manifest)
+        if len(values) != len(row_ids):
+            return None
+        tables.append(DefectTable.from_dense(values, batch, row_ids))
+    return DefectTable.concat(tables)
+
+
+def build_cube(name):
+    return build_pinned(name, lambda manifest: _build_cube(name, manifest), "cube")
+
+
+def _build_cube(name, manifest):
+    # Tổng hợp sẵn Reject/Inspection theo Supplier x Year x Month x Week x Model
+    # (thêm Process cho OSC, Part group cho Bottom). Mọi biểu đồ chỉ cần roll-up trên bảng này.
+    # Số lỗi được tổng hợp vào bảng defect dạng dài, row_id là vị trí dòng trong cube.
+    # Trả về None nếu các lần đọc không cùng số dòng.
+    config = SOURCES[name]
+    keys = config["cube_keys"]
+    df = read_columns(name, keys + config["measures"], manifest)
+
+    grouped = df.groupby(keys, sort=False, observed=True)
+    group_ids = grouped.ngroup().to_numpy()
+    # Tổng trên cube dùng int64 để không tràn khi cộng dồn các cột int32
+    df_cube = grouped[config["measures"]].sum().astype("int64").reset_index()
+
+    # Sắp xếp cube theo Supplier/Year/Week và đổi mã nhóm theo thứ tự mới
+    order = df_cube.sort_values(SORT_KEYS, kind="stable").index.to_numpy()
+    df_cube = df_cube.iloc[order].reset_index(drop=True)
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order))
+    row_ids = rank[group_ids]
+
+    defects = read_defects(name, manifest, row_ids)
+    if defects is None:
+        return None
+    return df_cube, defects
+
+
+def _load(name):
+    # Cube được build một lần cho mỗi phiên bản dữ liệu
+    version = data_version(name)
+    with _lock:
+        cached = _cache.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+    with profiling.stage(f"{name}: build cube"):
+        df_cube, defects = build_cube(name)
+
+    with _lock:
+        _cache[name] = (version, df_cube, defects)
+    return df_cube, defects
+
+
+def load_cube(name):
+    return _load(name)[0]
+
+
+def load_defects(name):
+    return _load(name)[1]
+
+
+def forget(name):
+    with _lock:
+        _cache.pop(name, None)
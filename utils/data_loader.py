@@ -0,0 +1,423 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pandas as pd
+
+from utils import profiling, snapshot
+
+# Thư mục chứa dữ liệu CSV (tính theo vị trí repo để chạy được từ mọi thư mục)
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+# Cấu hình chuẩn hóa cho từng nguồn dữ liệu; trang Defect Tracking cũng dựng giao diện từ cấu hình này
+# ("label" là tên Production Type hiển thị, "weekly_breakdown" là cột vẽ thêm Defect Rate theo tuần, None = không vẽ)
+SOURCES = {
+    "upper": {
+        "path": os.path.join(DATA_DIR, "upper.csv"),
+        "label": "Upper",
+        "category": "Upper",
+        "cube_keys": ["Supplier", "Year", "Month", "Week", "Model"],
+        "weekly_breakdown": None,
+        "measures": ["Reject Qty", "Inspection Qty"],
+        "text_columns": ["Supplier", "Model", "PGSC", "Po", "Result", "REMARK"],
+        "dimension_columns": ["Supplier", "Model", "PGSC"],
+        "percent_columns": ["Reject %"],
+        "detail_columns": ["Date", "PGSC", "Po", "Pass Qty", "Reject %", "Result", "REMARK"],
+        "numeric_columns": ["Year", "Week", "Month", "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty"],
+        "exclude_columns": ["Supplier", "Year", "Week", "Month", "Date", "Model", "PGSC", "Po",
+                            "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty", "Reject %", "Result", "REMARK"],
+    },
+    "bottom": {
+        "path": os.path.join(DATA_DIR, "bottom.csv"),
+        "label": "Bottom",
+        "category": "Bottom",
+        "cube_keys": ["Supplier", "Year", "Month", "Week", "Model", "Part group"],
+        "weekly_breakdown": None,
+        "measures": ["Reject Qty", "Inspection Qty", "Return Qty", "Target of Input Qty"],
+        "text_columns": ["Fac.", "Model", "PGSC", "Supplier", "Part group", "Result", "REMARK"],
+        "dimension_columns": ["Fac.", "Model", "PGSC", "Supplier", "Part group", "Result"],
+        "percent_columns": ["Percent", "Return %"],
+        "detail_columns": ["Date", "Fac.", "PGSC", "Stock Qty", "Pass Qty", "Percent", "Return %", "Result", "REMARK"],
+        "numeric_columns": ["Year", "Month", "Week", "Input Qty", "Target of Input Qty", "Inspection Qty", "Pass Qty",
+                            "Reject Qty", "Return Qty"],
+        "exclude_columns": ["Year", "Month", "Week", "Date", "Fac.", "Model", "PGSC", "Supplier", "Part group",
+                            "Target of Input Qty", "Stock Qty", "Input Qty", "Inspection Qty", "Pass Qty",
+                            "Reject Qty", "Return Qty", "Percent", "Return %", "Result", "REMARK"],
+    },
+    "outsourcing": {
+        "path": os.path.join(DATA_DIR, "outsourcing.csv"),
+        "label": "Outsourcing",
+        "category": "OSC",
+        "cube_keys": ["Supplier", "Year", "Month", "Week", "Model", "Process"],
+        "weekly_breakdown": "Process",
+        "measures": ["Reject Qty", "Inspection Qty"],
+        "text_columns": ["Supplier", "Part", "Process", "Model", "PGSC", "Po", "Result", "Remark"],
+        "dimension_columns": ["Supplier", "Part", "Process", "Model", "PGSC", "Result"],
+        "percent_columns": ["Reject %"],
+        "detail_columns": ["Date", "Part", "PGSC", "Po", "Pass Qty", "Reject %", "Result", "Remark"],
+        "numeric_columns": ["Year", "Month", "Week", "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty"],
+        "exclude_columns": ["Year", "Month", "Week", "Date", "Supplier", "Part", "Process", "Model", "PGSC", "Po",
+                            "Input Qty", "Inspection Qty", "Pass Qty", "Reject Qty", "Reject %", "Result", "Remark"],
+    },
+}
+
+# Kiểu số nguyên nhỏ nhất an toàn cho các cột lịch; các cột đếm khác dùng int32
+CALENDAR_DTYPES = {"Year": "int16", "Month": "int8", "Week": "int8"}
+
+# Cache theo process: (name, cột) -> (phiên bản file, DataFrame đã chuẩn hóa)
+_cache = {}
+_lock = threading.Lock()
+
+# Mỗi nguồn chỉ một luồng được ingest/cập nhật snapshot tại một thời điểm (các nguồn khác nhau ingest song song)
+_ingest_locks = {name: threading.Lock() for name in SOURCES}
+
+# Số luồng đọc các nguồn cùng lúc khi gộp nhiều nguồn (trang Home); 1 = đọc lần lượt.
+# Mặc định theo số CPU: trên máy 1 CPU đọc song song không nhanh hơn, còn parse nhiều CSV lớn cùng lúc
+# thì bộ nhớ đỉnh cộng dồn (đặt SUBCON_LOAD_WORKERS để chỉnh)
+LOAD_WORKERS = int(os.environ.get("SUBCON_LOAD_WORKERS", min(len(SOURCES), os.cpu_count() or 1)))
+
+# Lần append gần nhất của mỗi nguồn: name -> (phiên bản trước, phiên bản sau, các dòng mới)
+_appended = {}
+
+# Số byte đầu/cuối (tính tới offset đã ingest) dùng để nhận biết file chỉ được append thêm
+HEAD_BYTES = 64 * 1024
+TAIL_BYTES = 4 * 1024
+
+# Phiên bản định dạng snapshot: tăng khi cách chuẩn hóa/kiểu dữ liệu trong snapshot đổi theo code
+# (snapshot cũ có format khác hoặc cấu hình chuẩn hóa khác sẽ được ingest lại toàn bộ)
+SNAPSHOT_FORMAT = 2
+
+
+def data_version(name):
+    # Phiên bản dữ liệu = (mtime, size) của file nguồn, đổi khi file được ghi lại
+    stat = os.stat(SOURCES[name]["path"])
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def clean_column_name(name):
+    # Gộp các khoảng trắng/xuống dòng trong header (vd. "Color \nMigration" -> "Color Migration")
+    return re.sub(r"\s+", " ", str(name)).strip()
+
+
+def defect_columns(name, columns):
+    # Cột defect là tất cả các cột không nằm trong danh sách thông tin chung
+    exclude_columns = SOURCES[name]["exclude_columns"]
+    return [col for col in columns if col not in exclude_columns]
+
+
+def chart_columns(name, columns):
+    # Các cột cần cho biểu đồ: bỏ các cột chỉ dùng khi xuất chi tiết
+    detail_columns = SOURCES[name]["detail_columns"]
+    return [col for col in columns if col not in detail_columns]
+
+
+def normalize(name, df):
+    # Kiểu dữ liệu của mỗi cột được quyết định bởi cấu hình nguồn (không suy đoán từ dữ liệu),
+    # để các lô dữ liệu append sau luôn cùng schema với dữ liệu gốc
+    config = SOURCES[name]
+
+    df.columns = [clean_column_name(col) for col in df.columns]
+
+    # Chuyển cột ngày; ô trống thành NaT
+    df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+
+    # Chuỗi phần trăm ("3.20%") thành số thực (3.2)
+    for col in config["percent_columns"]:
+        df[col] = pd.to_numeric(df[col].astype(str).str.rstrip("%"), errors="coerce").fillna(0).astype(float)
+
+    # Cột chữ: ô trống thành chuỗi rỗng
+    for col in config["text_columns"]:
+        df[col] = df[col].fillna("").astype(str)
+
+    # Các cột còn lại (số lượng, defect) luôn là số: cột đếm chính là int, còn lại là float
+    other_columns = ["Date"] + config["percent_columns"] + config["text_columns"]
+    for col in df.columns:
+        if col in other_columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce").fillna(0)
+        df[col] = values.astype(int) if col in config["numeric_columns"] else values.astype(float)
+
+    return df
+
+
+def optimize_dtypes(name, df):
+    # Thu gọn bộ nhớ: cột chiều (Supplier, Model, ...) thành category, cột lịch/số lượng thành số nguyên
+    # nhỏ nhất an toàn, cột defect thành float32 (số đếm nguyên vẫn chính xác)
+    config = SOURCES[name]
+    for col in config["dimension_columns"]:
+        df[col] = df[col].astype("category")
+    for col in config["numeric_columns"]:
+        df[col] = df[col].astype(CALENDAR_DTYPES.get(col, "int32"))
+    for col in defect_columns(name, df.columns):
+        if col not in config["numeric_columns"]:
+            df[col] = df[col].astype("float32")
+    return df
+
+
+def _sort_categories(df):
+    # Sau khi nối các segment, thứ tự category có thể theo thứ tự xuất hiện; đưa về thứ tự chữ cái
+    for col in df.select_dtypes("category").columns:
+        categories = df[col].cat.categories
+        if not categories.is_monotonic_increasing:
+            df[col] = df[col].cat.reorder_categories(categories.sort_values())
+    return df
+
+
+def _concat(df_old, df_new):
+    # Nối dữ liệu cũ và các dòng mới; cột category được hợp nhất category trước để không bị đổi về object
+    for col in df_old.select_dtypes("category").columns:
+        categories = df_old[col].cat.categories.union(df_new[col].cat.categories)
+        df_old = df_old.assign(**{col: df_old[col].cat.set_categories(categories)})
+        df_new = df_new.assign(**{col: df_new[col].cat.set_categories(categories)})
+    return pd.concat([df_old, df_new], ignore_index=True)
+
+
+def _parse(name, buffer):
+    with profiling.stage(f"{name}: read csv"):
+        df = _read_csv(name, buffer)
+    with profiling.stage(f"{name}: normalize"):
+        df = normalize(name, df)
+    with profiling.stage(f"{name}: optimize dtypes"):
+        return optimize_dtypes(name, df)
+
+
+def _read_csv(name, buffer):
+    # Đọc CSV, các cột chữ được đọc thẳng dưới dạng chuỗi (vd. Po "900226967" không thành số)
+    text_columns = SOURCES[name]["text_columns"]
+    header = pd.read_csv(buffer, encoding="utf-8", nrows=0).columns
+    buffer.seek(0)
+    dtype = {col: str for col in header if clean_column_name(col) in text_columns}
+    return pd.read_csv(buffer, encoding="utf-8", dtype=dtype)
+
+
+def read_source(name):
+    with open(SOURCES[name]["path"], "rb") as f:
+        return _parse(name, BytesIO(f.read()))
+
+
+def _header_length(raw):
+    # Độ dài (byte) của dòng header, bỏ qua ký tự xuống dòng nằm trong dấu nháy ("Color \nMigration")
+    in_quotes = False
+    for i, byte in enumerate(raw):
+        if byte == 0x22:
+            in_quotes = not in_quotes
+        elif byte == 0x0A and not in_quotes:
+            return i + 1
+    return len(raw)
+
+
+def _fingerprint(f, offset):
+    # Hash phần đầu file và đoạn ngay trước offset; file bị ghi đè (không chỉ append) sẽ khác fingerprint
+    f.seek(0)
+    head = hashlib.sha1(f.read(min(offset, HEAD_BYTES))).hexdigest()
+    start = max(offset - TAIL_BYTES, 0)
+    f.seek(start)
+    tail = hashlib.sha1(f.read(offset - start)).hexdigest()
+    return head, tail
+
+
+def _schema(name):
+    # Hash cấu hình quyết định kiểu dữ liệu của các cột trong snapshot
+    config = SOURCES[name]
+    keys = ["text_columns", "dimension_columns", "percent_columns", "numeric_columns", "exclude_columns"]
+    schema = {key: config[key] for key in keys}
+    schema["calendar_dtypes"] = CALENDAR_DTYPES
+    return hashlib.sha1(json.dumps(schema, sort_keys=True).encode()).hexdigest()
+
+
+def _manifest(name, version, offset, header_length, fingerprint):
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "schema": _schema(name),
+        "source_mtime_ns": version[0],
+        "source_size": version[1],
+        "offset": offset,
+        "header_length": header_length,
+        "head_hash": fingerprint[0],
+        "tail_hash": fingerprint[1],
+    }
+
+
+def ingest(name):
+    # Parse toàn bộ CSV và ghi lại snapshot dạng cột; trả về DataFrame đầy đủ vừa đọc
+    path = SOURCES[name]["path"]
+    version = data_version(name)
+    with open(path, "rb") as f:
+        raw = f.read()
+        fingerprint = _fingerprint(f, len(raw))
+    df = _parse(name, BytesIO(raw))
+    if snapshot.is_available():
+        manifest = _manifest(name, version, len(raw), _header_length(raw[:HEAD_BYTES]), fingerprint)
+        with profiling.stage(f"{name}: write snapshot"):
+            snapshot.write_snapshot(name, df, manifest)
+    return df
+
+
+def ingest_appended(name, manifest):
+    # Chỉ parse phần được append sau offset đã ingest; trả về None nếu file đã bị sửa/ghi đè
+    path = SOURCES[name]["path"]
+    version = data_version(name)
+    offset = manifest["offset"]
+    if version[1] < offset:
+        return None
+
+    with open(path, "rb") as f:
+        if _fingerprint(f, offset) != (manifest["head_hash"], manifest["tail_hash"]):
+            return None
+        f.seek(0)
+        header = f.read(manifest["header_length"])
+        f.seek(offset)
+        chunk = f.read(version[1] - offset)
+
+        # Chỉ lấy tới dòng hoàn chỉnh cuối cùng, phần đang ghi dở để lần sau
+        end = chunk.rfind(b"\n") + 1
+        chunk = chunk[:end]
+        fingerprint = _fingerprint(f, offset + end)
+
+    df_new = _parse(name, BytesIO(header + chunk))
+    if list(df_new.columns) != manifest["columns"]:
+        return None
+
+    new_manifest = _manifest(name, version, offset + end, manifest["header_length"], fingerprint)
+    if df_new.empty:
+        # Chưa có dòng hoàn chỉnh nào mới, chỉ cập nhật phiên bản
+        snapshot.update_manifest(name, new_manifest)
+    else:
+        snapshot.append_segment(name, df_new, new_manifest)
+    return df_new
+
+
+def refresh(name):
+    # Đưa snapshot về đúng phiên bản file hiện tại; ghi nhận các dòng mới nếu file chỉ được append
+    with _ingest_locks[name]:
+        manifest = snapshot.read_manifest(name)
+        if manifest is not None and (manifest.get("format") != SNAPSHOT_FORMAT
+                                     or manifest.get("schema") != _schema(name)):
+            # Snapshot ghi bởi code cũ (kiểu dữ liệu có thể khác): bỏ qua, ingest lại toàn bộ
+            manifest = None
+        if manifest is not None and snapshot.snapshot_version(name) == data_version(name):
+            return
+        if manifest is not None:
+            previous_version = (manifest["source_mtime_ns"], manifest["source_size"])
+            df_new = ingest_appended(name, manifest)
+            if df_new is not None:
+                _appended[name] = (previous_version, snapshot.snapshot_version(name), df_new)
+                return
+        _appended.pop(name, None)
+        ingest(name)
+
+
+def source_columns(name):
+    # Danh sách cột (đã chuẩn hóa tên) của nguồn, đọc từ schema snapshot nếu có
+    if not snapshot.is_available():
+        return list(load_source(name).columns)
+    refresh(name)
+    return snapshot.snapshot_columns(name)
+
+
+def pin_snapshot(name):
+    # Cập nhật snapshot rồi trả về manifest hiện tại, để nhiều lần read_columns cùng đọc một phiên bản dữ liệu
+    # (None nếu không có pyarrow)
+    if not snapshot.is_available():
+        return None
+    refresh(name)
+    return snapshot.read_manifest(name)
+
+
+def read_columns(name, columns, manifest=None):
+    # Đọc một nhóm cột mà không giữ lại trong cache (dữ liệu chỉ dùng tạm, vd. để build bảng defect).
+    # manifest (pin_snapshot): đọc đúng phiên bản đó, không cập nhật snapshot; segment của phiên bản cũ có thể
+    # đã bị xóa (FileNotFoundError) nếu snapshot được build lại trong lúc đó
+    if not snapshot.is_available():
+        return read_source(name)[list(columns)]
+    if manifest is None:
+        refresh(name)
+    return _sort_categories(snapshot.read_snapshot(name, list(columns), manifest))
+
+
+def load_source(name, columns=None):
+    # Trả về DataFrame đã chuẩn hóa, chỉ đọc lại dữ liệu khi file CSV thay đổi.
+    # Đọc từ snapshot Arrow (chỉ các cột trong `columns`); nếu file chỉ được append thêm thì
+    # chỉ parse các dòng mới và nối vào dữ liệu đang cache.
+    # DataFrame được dùng chung giữa các lần rerun nên phía gọi không được sửa trực tiếp.
+    key = (name, tuple(columns) if columns is not None else None)
+    version = data_version(name)
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    if not snapshot.is_available():
+        df = read_source(name)
+        if columns is not None:
+            df = df[list(columns)]
+    else:
+        refresh(name)
+        version = snapshot.snapshot_version(name)
+        appended = _appended.get(name)
+        if cached is not None and appended is not None and appended[:2] == (cached[0], version):
+            df_new = appended[2] if columns is None else appended[2][list(columns)]
+            df = _concat(cached[1], df_new)
+        else:
+            with profiling.stage(f"{name}: read snapshot"):
+                df = _sort_categories(snapshot.read_snapshot(name, columns))
+
+    with _lock:
+        _cache[key] = (version, df)
+    return df
+
+
+def forget(name):
+    # Bỏ DataFrame đã cache của một nguồn
+    with _lock:
+        for key in [key for key in _cache if key[0] == name]:
+            del _cache[key]
+        _appended.pop(name, None)
+
+
+def load_sources(names, columns=None, workers=None, cache=True):
+    # load_source của nhiều nguồn cùng lúc trong thread pool (đọc file, parse CSV và đọc snapshot của pandas/pyarrow
+    # phần lớn nhả GIL); trả về danh sách DataFrame theo thứ tự names.
+    # cache=False: đọc bằng read_columns (cần columns), không giữ lại dữ liệu trong cache của process
+    read = load_source if cache else read_columns
+    workers = min(LOAD_WORKERS if workers is None else workers, len(names))
+    if workers <= 1:
+        return [read(name, columns) for name in names]
+    # Các bước đo trong luồng worker được ghi vào lần chạy trang đang profiling của luồng gọi
+    run_context = profiling.context()
+
+    def load(name):
+        with profiling.attach(run_context):
+            return read(name, columns)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="load") as pool:
+        return list(pool.map(load, names))
+
+
+def load_combined(names=("upper", "bottom", "outsourcing")):
+    # Gộp các nguồn cho trang Home, thêm cột Category. Không cache: dữ liệu chỉ dùng để build bảng tổng hợp
+    # (DailyRollup), sau đó không còn bản dữ liệu theo dòng nào được giữ lại
+    frames = []
+    for name, df in zip(names, load_sources(names, ["Date", "Input Qty", "Reject Qty"], cache=False)):
+        df["Category"] = SOURCES[name]["category"]
+        frames.append(df)
+    df_combined = pd.concat(frames, ignore_index=True)
+    df_combined["Category"] = df_combined["Category"].astype("category")
+    return df_combined
+
+
+if __name__ == "__main__":
+    # Bước ingest: python -m utils.data_loader -> build lại snapshot cho tất cả nguồn,
+    # kèm bộ nhớ của DataFrame trước/sau khi thu gọn kiểu dữ liệu
+    for source_name in SOURCES:
+        df_source = ingest(source_name)
+        with open(SOURCES[source_name]["path"], "rb") as f:
+            df_plain = normalize(source_name, _read_csv(source_name, BytesIO(f.read())))
+        before = df_plain.memory_usage(deep=True).sum() / 1024
+        after = df_source.memory_usage(deep=True).sum() / 1024
+        print(f"{source_name}: {len(df_source)} rows -> {snapshot.manifest_path(source_name)} | "
+              f"memory {before:,.0f} KiB -> {after:,.0f} KiB ({after / before:.0%})")
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+
+class DefectTable:
+    # Bảng số lỗi dạng dài (row_id, defect_code, count), chỉ lưu các ô khác 0.
+    # Các cột defect gần như toàn ô trống nên bảng này nhỏ hơn nhiều lần so với ma trận dày float64.
+    # row_ids được sắp xếp tăng dần để tra một khoảng dòng liên tục bằng searchsorted.
+
+    def __init__(self, row_ids, codes, counts, names):
+        self.row_ids = row_ids.astype(np.int32)
+        self.codes = codes.astype(np.int16)
+        self.counts = counts.astype(np.int32)
+        self.names = list(names)
+
+    @classmethod
+    def from_dense(cls, df, defect_columns, row_ids=None):
+        # row_ids: mã dòng đích của từng dòng trong df (mặc định là vị trí dòng);
+        # các dòng trùng (row_id, defect) được cộng dồn
+        if row_ids is None:
+            row_ids = np.arange(len(df))
+        parts_rows, parts_codes, parts_counts = [], [], []
+        for code, col in enumerate(defect_columns):
+            values = df[col].to_numpy()
+            nonzero = np.flatnonzero(values)
+            parts_rows.append(row_ids[nonzero])
+            parts_codes.append(np.full(len(nonzero), code))
+            parts_counts.append(values[nonzero])
+        table = cls(
+            np.concatenate([np.empty(0)] + parts_rows),
+            np.concatenate([np.empty(0)] + parts_codes),
+            np.concatenate([np.empty(0)] + parts_counts),
+            defect_columns,
+        )
+        return table.compact()
+
+    @classmethod
+    def concat(cls, tables):
+        # Nối các bảng của những nhóm cột defect khác nhau (mã lỗi được đánh lại liên tiếp)
+        names, offset = [], 0
+        row_ids, codes, counts = [np.empty(0)], [np.empty(0)], [np.empty(0)]
+        for table in tables:
+            row_ids.append(table.row_ids)
+            codes.append(table.codes.astype(np.int64) + offset)
+            counts.append(table.counts)
+            names += table.names
+            offset += len(table.names)
+        return cls(np.concatenate(row_ids), np.concatenate(codes), np.concatenate(counts), names).compact()
+
+    def compact(self):
+        # Gộp các cặp (row_id, defect) trùng nhau và sắp xếp theo row_id
+        n_codes = max(len(self.names), 1)
+        keys = self.row_ids.astype(np.int64) * n_codes + self.codes
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=self.counts, minlength=len(unique_keys))
+        return DefectTable(unique_keys // n_codes, unique_keys % n_codes, counts, self.names)
+
+    @property
+    def nbytes(self):
+        return self.row_ids.nbytes + self.codes.nbytes + self.counts.nbytes
+
+    def _positions(self, row_ids):
+        # Vị trí các bản ghi thuộc các dòng đã chọn; khoảng liên tục thì chỉ cần searchsorted
+        row_ids = np.asarray(row_ids)
+        if len(row_ids) == 0:
+            return slice(0, 0)
+        if row_ids[-1] - row_ids[0] + 1 == len(row_ids):
+            start, stop = np.searchsorted(self.row_ids, [row_ids[0], row_ids[-1] + 1])
+            return slice(start, stop)
+        return np.isin(self.row_ids, row_ids)
+
+    def totals(self, row_ids):
+        # Tổng số lỗi theo từng loại lỗi (theo thứ tự cột gốc) trên các dòng đã chọn
+        positions = self._positions(row_ids)
+        totals = np.bincount(self.codes[positions], weights=self.counts[positions], minlength=len(self.names))
+        return pd.Series(totals, index=self.names)
+
+    def matrix(self, row_ids, groups, n_groups):
+        # Ma trận dày (nhóm x loại lỗi) trên các dòng đã chọn; groups[i] là nhóm của row_ids[i]
+        lookup = np.full(int(self.row_ids.max(initial=0)) + 1, -1, dtype=np.int64)
+        row_ids = np.asarray(row_ids)
+        in_table = row_ids < len(lookup)
+        lookup[row_ids[in_table]] = np.asarray(groups)[in_table]
+
+        positions = self._positions(row_ids)
+        rows = lookup[self.row_ids[positions]]
+        keep = rows >= 0
+        n_codes = len(self.names)
+        flat = np.bincount(
+            rows[keep] * n_codes + self.codes[positions][keep],
+            weights=self.counts[positions][keep],
+            minlength=n_groups * n_codes,
+        )
+        return flat.reshape(n_groups, n_codes)
+
+
+def defect_rate_matrix(df, defects, by="Model"):
+    # Ma trận tỷ lệ lỗi (%) = số lỗi / Inspection Qty * 100, dòng là loại lỗi, cột là Model.
+    # df là lát cắt cube đã chọn (index = row_id trong bảng defect); số lỗi lấy từ bảng defect dạng dài.
+    # Tính trực tiếp trên ma trận rộng bằng NumPy (không melt/merge/apply/pivot);
+    # Model có Inspection Qty = 0 cho tỷ lệ 0. Ô có tỷ lệ 0 để trống (NaN), dòng/cột toàn 0 bị bỏ.
+    groups, models = pd.factorize(df[by], sort=True)
+    counts = defects.matrix(df.index.to_numpy(), groups, len(models))
+    inspection = np.bincount(groups, weights=df["Inspection Qty"].to_numpy(dtype=float), minlength=len(models))
+    return rate_matrix(counts, inspection, models, defects.names, by)
+
+
+def rate_matrix(counts, inspection, models, names, by="Model"):
+    # counts: ma trận số lỗi (nhóm x loại lỗi), inspection: tổng Inspection Qty của từng nhóm
+    inspection = np.asarray(inspection, dtype=float)[:, None]
+    rates = np.zeros(counts.shape)
+    np.divide(counts * 100, inspection, out=rates, where=inspection > 0)
+    rates = rates.round(2)
+
+    visible = rates > 0
+    keep_models = visible.any(axis=1)
+    keep_defects = visible.any(axis=0)
+    rates = np.where(visible, rates, np.nan)[keep_models][:, keep_defects]
+
+    matrix = pd.DataFrame(
+        rates.T,
+        index=pd.Index(np.asarray(names, dtype=object)[keep_defects], name="Defect Type"),
+        columns=pd.Index(models[keep_models], name=by),
+    )
+    return matrix.sort_index()
@@ -0,0 +1,143 @@
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import xlsxwriter
+
+from utils import profiling
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Không có pyarrow thì không xuất được Parquet
+    pa = None
+    pq = None
+
+# Số dòng ghi mỗi lần; chỉ một lô dòng được chuyển sang object Python tại một thời điểm
+CHUNK_ROWS = 10_000
+
+SHEET_NAME = "Filtered Data"
+
+# Cache LRU các file đã xuất: (nguồn, phiên bản dữ liệu, subcon, year, week, định dạng) -> bytes.
+# Tổng dung lượng giữ trong cache không vượt quá EXPORT_CACHE_BYTES.
+EXPORT_CACHE_BYTES = 64 * 2**20
+_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.Lock()
+
+# Định dạng ngày giống pd.ExcelWriter(engine="xlsxwriter") để nội dung file xuất ra không đổi so với trước
+DATETIME_FORMAT = "YYYY-MM-DD HH:MM:SS"
+
+
+def _chunks(df, progress=None):
+    # progress(done, total) được gọi sau mỗi lô dòng đã ghi xong
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+        if progress is not None:
+            progress(min(start + CHUNK_ROWS, len(df)), len(df))
+
+
+def new_workbook(output):
+    # constant_memory: mỗi dòng được ghi thẳng ra file tạm ngay khi ghi xong, không giữ cả sheet trong bộ nhớ
+    # (bắt buộc ghi lần lượt từng dòng từ trên xuống trong mỗi sheet)
+    return xlsxwriter.Workbook(output, {"constant_memory": True, "default_date_format": DATETIME_FORMAT})
+
+
+def excel_records(df):
+    # Giá trị các ô theo từng dòng, NaN/NaT -> ô trống
+    return df.astype(object).where(df.notna(), None).to_numpy()
+
+
+def write_records(worksheet, columns, records):
+    # Ghi dòng tiêu đề rồi lần lượt các dòng dữ liệu
+    worksheet.write_row(0, 0, [str(col) for col in columns])
+    for row, record in enumerate(records, start=1):
+        worksheet.write_row(row, 0, record)
+
+
+def write_excel(df, output, progress=None):
+    workbook = new_workbook(output)
+    worksheet = workbook.add_worksheet(SHEET_NAME)
+    worksheet.write_row(0, 0, [str(col) for col in df.columns])
+
+    row = 1
+    for chunk in _chunks(df, progress):
+        for record in excel_records(chunk):
+            worksheet.write_row(row, 0, record)
+            row += 1
+    workbook.close()
+
+
+def write_csv(df, output, progress=None):
+    for i, chunk in enumerate(_chunks(df, progress)):
+        output.write(chunk.to_csv(index=False, header=i == 0).encode("utf-8"))
+    if df.empty:
+        output.write(df.to_csv(index=False).encode("utf-8"))
+
+
+def write_parquet(df, output, progress=None):
+    # Mỗi lô dòng là một row group, schema lấy từ toàn bộ frame để các lô khớp kiểu
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(output, schema) as writer:
+        for chunk in _chunks(df, progress):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+# Các định dạng xuất file: tên hiển thị -> (hàm ghi, phần mở rộng, MIME type)
+EXPORT_FORMATS = {
+    "Excel": (write_excel, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": (write_csv, "csv", "text/csv"),
+}
+if pa is not None:
+    EXPORT_FORMATS["Parquet"] = (write_parquet, "parquet", "application/vnd.apache.parquet")
+
+
+def export_file(df, fmt, path, progress=None):
+    # Ghi thẳng ra file trên đĩa (dùng cho CLI/báo cáo)
+    with open(path, "wb") as f:
+        EXPORT_FORMATS[fmt][0](df, f, progress)
+
+
+def export_bytes(df, fmt, progress=None):
+    output = BytesIO()
+    EXPORT_FORMATS[fmt][0](df, output, progress)
+    return output.getvalue()
+
+
+def export_file_name(subcon, year, week, fmt):
+    return f"{subcon}_Year{year}_Week{week}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def export_cache_key(name, version, subcon, year, week, fmt):
+    # version là phiên bản của chính dữ liệu được xuất (shared.export_index) để key khớp với dữ liệu
+    return (name, version, subcon, year, week, fmt)
+
+
+def _evict(key):
+    # Gọi khi đang giữ _lock
+    global _cache_bytes
+    _cache_bytes -= len(_cache.pop(key))
+
+
+def cached_export(key, df, progress=None):
+    # Trả về file đã xuất nếu cùng nguồn/phiên bản/bộ lọc/định dạng đã được tạo trước đó, nếu không thì tạo mới
+    global _cache_bytes
+    with _lock:
+        data = _cache.get(key)
+        if data is not None:
+            _cache.move_to_end(key)
+            return data
+
+    with profiling.stage(f"{key[0]}: export {key[-1]}"):
+        data = export_bytes(df, key[-1], progress)
+
+    with _lock:
+        # File của phiên bản dữ liệu cũ không còn được dùng nữa
+        for stale in [other for other in _cache if other[0] == key[0] and other[1] != key[1]]:
+            _evict(stale)
+        if key not in _cache and len(data) <= EXPORT_CACHE_BYTES:
+            _cache[key] = data
+            _cache_bytes += len(data)
+            while _cache_bytes > EXPORT_CACHE_BYTES:
+                _evict(next(iter(_cache)))
+    return data
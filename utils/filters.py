@@ -0,0 +1,149 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import load_cube
+from utils.data_loader import data_version, load_source
+
+# Cache theo process: (loại, name) -> (phiên bản dữ liệu, FilterIndex)
+_cache = {}
+_lock = threading.Lock()
+
+
+class FilterIndex:
+    # Sắp xếp frame một lần theo các cột lọc (mặc định Supplier, Year, Week) và mã hóa mỗi cột
+    # thành mã số nguyên đã sắp xếp. Lọc theo một tiền tố các cột (Supplier; Supplier + Year; ...)
+    # chỉ là tìm khoảng liên tục bằng searchsorted và trả về lát cắt iloc, không so sánh cả cột.
+
+    def __init__(self, df, keys=("Supplier", "Year", "Week")):
+        self.keys = list(keys)
+        self.frame = df.sort_values(self.keys, kind="stable", ignore_index=True)
+
+        self.categories = {}
+        self.codes = {}
+        composite = np.zeros(len(self.frame), dtype=np.int64)
+        for key in self.keys:
+            codes, categories = pd.factorize(self.frame[key], sort=True)
+            self.categories[key] = categories
+            self.codes[key] = codes
+            composite = composite * len(categories) + codes
+        self.composite = composite
+
+        # radix[i] = số tổ hợp mã của các cột sau cột i
+        self.radix = []
+        for i in range(len(self.keys)):
+            self.radix.append(int(np.prod([len(self.categories[key]) for key in self.keys[i + 1:]], dtype=np.int64)))
+
+    def options(self, key):
+        # Các giá trị khác nhau (đã sắp xếp) của một cột lọc
+        return list(self.categories[key])
+
+    def select(self, **criteria):
+        # criteria: {cột: giá trị}; giá trị None hoặc "All" nghĩa là không lọc theo cột đó
+        criteria = {key: value for key, value in criteria.items() if value is not None and value != "All"}
+
+        codes = {}
+        for key, value in criteria.items():
+            code = self.categories[key].get_indexer([value])[0]
+            if code < 0:
+                return self.frame.iloc[0:0]
+            codes[key] = code
+
+        # Phần tiền tố (Supplier, Year, ...) -> một khoảng liên tục trên mã tổng hợp
+        start, stop = 0, len(self.frame)
+        low = 0
+        prefix = 0
+        for i, key in enumerate(self.keys):
+            if key not in codes:
+                break
+            low += codes[key] * self.radix[i]
+            prefix = i + 1
+        if prefix:
+            high = low + self.radix[prefix - 1]
+            start, stop = np.searchsorted(self.composite, [low, high])
+
+        view = self.frame.iloc[start:stop]
+
+        # Các cột còn lại (không thuộc tiền tố) lọc bằng mã số nguyên trong khoảng đã cắt
+        rest = [key for key in self.keys[prefix:] if key in codes]
+        if rest:
+            mask = np.ones(stop - start, dtype=bool)
+            for key in rest:
+                mask &= self.codes[key][start:stop] == codes[key]
+            view = view[mask]
+        return view
+
+
+class DailyRollup:
+    # Tổng theo ngày của các cột measure cho từng nhóm (Category), sắp xếp theo (nhóm, ngày), kèm tổng lũy kế
+    # (prefix sum) trong mỗi nhóm. Tổng của một khoảng ngày chỉ là hiệu hai tổng lũy kế tại hai vị trí tìm bằng
+    # searchsorted, không phụ thuộc số dòng dữ liệu gốc.
+
+    def __init__(self, df, columns, group="Category", date="Date"):
+        self.group = group
+        self.columns = list(columns)
+        days = df[date].dt.normalize().rename(date)
+        daily = df.groupby([df[group], days], observed=True, sort=True)[self.columns].sum()
+        daily["Rows"] = df.groupby([df[group], days], observed=True, sort=True).size()
+
+        codes, self.groups = pd.factorize(daily.index.get_level_values(group), sort=True)
+        # bounds[i]:bounds[i + 1] là khoảng ngày của nhóm thứ i
+        self.bounds = np.searchsorted(codes, np.arange(len(self.groups) + 1))
+        self.days = daily.index.get_level_values(date).to_numpy()
+        # Ngày đầu tiên / cuối cùng có dữ liệu (pd.Timestamp, None nếu rỗng)
+        self.first = pd.Timestamp(self.days.min()) if len(self.days) else None
+        self.last = pd.Timestamp(self.days.max()) if len(self.days) else None
+
+        # cumulative[k] = tổng các ngày trước vị trí k trong cùng nhóm (mỗi nhóm có thêm một dòng 0 ở đầu)
+        values = daily[self.columns + ["Rows"]].to_numpy(dtype=np.int64)
+        self.cumulative = np.zeros((len(values) + len(self.groups), values.shape[1]), dtype=np.int64)
+        for i in range(len(self.groups)):
+            low, high = self.bounds[i], self.bounds[i + 1]
+            self.cumulative[low + i + 1:high + i + 1] = values[low:high].cumsum(axis=0)
+
+    def totals(self, start=None, end=None):
+        # Tổng các cột theo nhóm cho các ngày trong [start, end] (None = không giới hạn);
+        # chỉ gồm các nhóm có dữ liệu trong khoảng (như groupby(observed=True))
+        rows, present = [], []
+        for i in range(len(self.groups)):
+            low, high = self.bounds[i], self.bounds[i + 1]
+            days = self.days[low:high]
+            first = np.searchsorted(days, pd.Timestamp(start).to_datetime64(), side="left") if start is not None else 0
+            last = np.searchsorted(days, pd.Timestamp(end).to_datetime64(), side="right") if end is not None else high - low
+            total = self.cumulative[low + i + last] - self.cumulative[low + i + first]
+            present.append(total[-1] > 0)
+            if total[-1] > 0:
+                rows.append(total[:-1])
+        return pd.DataFrame(rows, index=pd.Index(self.groups[np.array(present, dtype=bool)], name=self.group),
+                            columns=self.columns)
+
+
+def _load_index(kind, name, loader):
+    version = data_version(name)
+    with _lock:
+        cached = _cache.get((kind, name))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+    index = FilterIndex(loader(name))
+
+    with _lock:
+        _cache[(kind, name)] = (version, index)
+    return index
+
+
+def cube_index(name):
+    # Chỉ mục lọc trên cube tổng hợp, dùng cho các biểu đồ
+    return _load_index("cube", name, load_cube)
+
+
+def row_index(name):
+    # Chỉ mục lọc trên dữ liệu chi tiết, dùng khi xuất file
+    return _load_index("rows", name, load_source)
+
+
+def forget(name):
+    with _lock:
+        for kind in ("cube", "rows"):
+            _cache.pop((kind, name), None)
@@ -0,0 +1,107 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Số job chạy song song, các job còn lại xếp hàng chờ
+MAX_WORKERS = 2
+
+# Thời gian (giây) giữ kết quả của job đã xong để người dùng quay lại tải
+JOB_TTL = 15 * 60
+
+# Tổng dung lượng kết quả (file) của các job đã xong được giữ lại; vượt quá thì bỏ kết quả cũ nhất trước
+# (job bị bỏ coi như hết hạn, bấm tạo lại sẽ lấy từ cache xuất file nếu còn)
+JOB_RESULT_BYTES = 64 * 2**20
+
+# Job chạy nền dùng chung cho cả process (vd. tạo file xuất), tra cứu bằng job id:
+#   job_id -> {"key", "done", "total", "result", "error", "started", "finished"}
+# Cùng một key (vd. cùng nguồn/phiên bản/bộ lọc/định dạng) chỉ chạy một job, các phiên khác dùng lại job đó.
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="job")
+_jobs = {}
+_by_key = {}
+_lock = threading.Lock()
+
+
+def _result_size(job):
+    result = job["result"]
+    return len(result) if isinstance(result, (bytes, bytearray)) else 0
+
+
+def _remove(job_id):
+    job = _jobs.pop(job_id)
+    if _by_key.get(job["key"]) == job_id:
+        del _by_key[job["key"]]
+
+
+def _expire(keep=None):
+    # Gọi khi đang giữ _lock. Bỏ các job hết hạn, rồi các kết quả cũ nhất cho tới khi tổng dung lượng
+    # không vượt quá JOB_RESULT_BYTES (trừ job `keep` vừa xong, người dùng chưa kịp tải)
+    now = time.monotonic()
+    for job_id, job in list(_jobs.items()):
+        if job["finished"] is not None and now - job["finished"] > JOB_TTL:
+            _remove(job_id)
+
+    finished = sorted((item for item in _jobs.items() if item[1]["finished"] is not None),
+                      key=lambda item: item[1]["finished"])
+    total = sum(_result_size(job) for _, job in finished)
+    for job_id, job in finished:
+        if total <= JOB_RESULT_BYTES:
+            break
+        if job_id != keep:
+            total -= _result_size(job)
+            _remove(job_id)
+
+
+def submit(key, func):
+    # func(progress) -> kết quả; progress(done, total) được gọi từ luồng worker để báo tiến độ
+    with _lock:
+        _expire()
+        job_id = _by_key.get(key)
+        if job_id is not None and _jobs[job_id]["error"] is None:
+            return job_id
+        job_id = uuid.uuid4().hex
+        job = {"key": key, "done": 0, "total": 0, "result": None, "error": None, "started": None, "finished": None}
+        _jobs[job_id] = job
+        _by_key[key] = job_id
+
+    def progress(done, total):
+        job["done"], job["total"] = done, total
+
+    def run():
+        job["started"] = time.monotonic()
+        try:
+            job["result"] = func(progress)
+        except Exception as e:
+            job["error"] = e
+        with _lock:
+            job["finished"] = time.monotonic()
+            _expire(keep=job_id)
+
+    _executor.submit(run)
+    return job_id
+
+
+def status(job_id):
+    # (trạng thái, tỷ lệ hoàn thành); trạng thái là "queued", "running", "done" hoặc "failed".
+    # None nếu job không tồn tại hoặc đã hết hạn
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+    if job["finished"] is not None:
+        return ("failed" if job["error"] is not None else "done"), 1.0
+    if job["started"] is None:
+        return "queued", 0.0
+    return "running", job["done"] / job["total"] if job["total"] else 0.0
+
+
+def result(job_id):
+    # Kết quả của job đã xong; lỗi trong job được raise lại ở phía gọi.
+    # None nếu job đã hết hạn (có thể xảy ra ngay sau status(), khi job khác xong hoặc được tạo)
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return None
+    if job["error"] is not None:
+        raise job["error"]
+    return job["result"]
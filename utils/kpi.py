@@ -0,0 +1,145 @@
+import argparse
+import os
+
+import pandas as pd
+
+from utils.data_loader import SOURCES, defect_columns, load_combined, load_source
+from utils.filters import DailyRollup
+
+# Các tỷ lệ (%) tính từ cặp measure: tên cột -> (tử số, mẫu số)
+RATES = {
+    "Defect Rate (%)": ("Reject Qty", "Inspection Qty"),
+    "Return Rate (%)": ("Return Qty", "Target of Input Qty"),
+}
+
+# Số Model có defect rate cao nhất hiển thị trong biểu đồ Top Models
+TOP_MODELS = 3
+
+
+def rate_measures(columns):
+    # Các measure dùng để tính tỷ lệ có trong danh sách cột
+    return [col for pair in RATES.values() for col in pair if col in columns]
+
+
+def with_rates(table, measures):
+    # Thêm các tỷ lệ (%) tính được từ các cột tổng measure.
+    # Mẫu số = 0 và tử số = 0 cho tỷ lệ 0, làm tròn 2 chữ số thập phân.
+    for rate, (numerator, denominator) in RATES.items():
+        if numerator in measures and denominator in measures:
+            table[rate] = (table[numerator] / table[denominator] * 100).fillna(0).round(2)
+    return table
+
+
+def rate_table(df, by, measures=None):
+    # Tổng các measure theo nhóm `by` và các tỷ lệ (%) tính được từ các measure đó
+    if measures is None:
+        measures = rate_measures(df.columns)
+    return with_rates(df.groupby(by, observed=True)[measures].sum().reset_index(), measures)
+
+
+def rank_models(table, top=TOP_MODELS):
+    # Các Model có defect rate cao nhất từ bảng tỷ lệ theo Model
+    return table.sort_values("Defect Rate (%)", ascending=False).head(top)
+
+
+def top_models(df, top=TOP_MODELS):
+    # Các Model có defect rate cao nhất
+    return rank_models(rate_table(df, "Model"), top)
+
+
+def defect_pareto(totals):
+    # Bảng Pareto từ tổng số lỗi theo loại lỗi (Series): chỉ các lỗi > 0, giảm dần, kèm tỷ lệ lũy kế
+    df_defect_types = totals.reset_index()
+    df_defect_types.columns = ["Defect Type", "Defect Count"]
+    df_defect_types["Defect Count"] = pd.to_numeric(df_defect_types["Defect Count"], errors="coerce").fillna(0).astype(int)
+    df_defect_types = df_defect_types[df_defect_types["Defect Count"] > 0].sort_values("Defect Count", ascending=False)
+    df_defect_types["Defect Type"] = df_defect_types["Defect Type"].astype(str)
+    df_defect_types["Cumulative %"] = df_defect_types["Defect Count"].cumsum() / float(df_defect_types["Defect Count"].sum()) * 100
+    return df_defect_types
+
+
+def defect_shares(totals):
+    # Tỷ lệ (%) của từng loại lỗi trên tổng số lỗi, bỏ các lỗi 0%
+    df_defect_types = totals.reset_index()
+    df_defect_types.columns = ["Defect Type", "Defect Count"]
+    df_defect_types["Defect Percentage"] = (df_defect_types["Defect Count"] / df_defect_types["Defect Count"].sum() * 100).fillna(0)
+    df_defect_types = df_defect_types[df_defect_types["Defect Percentage"] > 0]
+    df_defect_types["Defect Percentage"] = df_defect_types["Defect Percentage"].round(2)
+    return df_defect_types
+
+
+# Các cột cộng dồn cho KPI trang Home
+HOME_MEASURES = ["Input Qty", "Reject Qty"]
+
+
+def reject_summary(totals):
+    # KPI trang Home từ tổng Input/Reject theo Category: thêm % Reject (trên Input Qty)
+    summary = totals.astype("int64")
+    summary["% Reject"] = (summary["Reject Qty"] / summary["Input Qty"] * 100).where(summary["Input Qty"] > 0, 0).round(2)
+    return summary
+
+
+def category_summary(df):
+    # KPI trang Home: tổng Input/Reject và % Reject (trên Input Qty) theo Category
+    return reject_summary(df.groupby("Category", observed=True)[HOME_MEASURES].sum())
+
+
+def date_range(df, start=None, end=None):
+    # Các dòng có Date trong khoảng [start, end] (None = không giới hạn)
+    mask = pd.Series(True, index=df.index)
+    if start is not None:
+        mask &= df["Date"] >= pd.to_datetime(start)
+    if end is not None:
+        mask &= df["Date"] <= pd.to_datetime(end)
+    return df[mask]
+
+
+def source_kpis(name, df):
+    # Các bảng KPI của trang Defect Tracking cho tất cả Subcon của một nguồn (thêm cột Supplier).
+    # Bảng theo tháng/tuần có thêm Year: khoảng ngày có thể qua nhiều năm (trang luôn lọc một Year)
+    tables = {
+        "monthly": rate_table(df, ["Supplier", "Year", "Month"]),
+        "weekly": rate_table(df, ["Supplier", "Year", "Week"]),
+        "models": rate_table(df, ["Supplier", "Model"])
+        .sort_values(["Supplier", "Defect Rate (%)"], ascending=[True, False], kind="stable")
+        .groupby("Supplier", observed=True).head(TOP_MODELS),
+    }
+    if "Process" in df.columns:
+        tables["process_weekly"] = rate_table(df, ["Supplier", "Year", "Week", "Process"])
+
+    columns = defect_columns(name, df.columns)
+    pareto = []
+    for supplier, totals in df.groupby("Supplier", observed=True)[columns].sum().iterrows():
+        df_pareto = defect_pareto(totals)
+        df_pareto.insert(0, "Supplier", supplier)
+        pareto.append(df_pareto)
+    tables["pareto"] = pd.concat(pareto, ignore_index=True) if pareto else pd.DataFrame(
+        columns=["Supplier", "Defect Type", "Defect Count", "Cumulative %"])
+    return tables
+
+
+def compute_kpis(start=None, end=None, names=tuple(SOURCES)):
+    # Tất cả bảng KPI cho khoảng ngày [start, end]: {tên bảng: DataFrame}; home_summary chỉ gồm Category của các
+    # nguồn trong names
+    rollup = DailyRollup(load_combined(tuple(names)), HOME_MEASURES)
+    tables = {"home_summary": reject_summary(rollup.totals(start, end)).reset_index()}
+    for name in names:
+        for table_name, table in source_kpis(name, date_range(load_source(name), start, end)).items():
+            tables[f"{name}_{table_name}"] = table
+    return tables
+
+
+if __name__ == "__main__":
+    # python -m utils.kpi --start 2025-01-01 --end 2025-03-31 --output-dir kpi
+    parser = argparse.ArgumentParser(description="Compute the tracking KPI tables for a date range and write them as CSV")
+    parser.add_argument("--start")
+    parser.add_argument("--end")
+    parser.add_argument("--output-dir", default="kpi")
+    parser.add_argument("--source", action="append", choices=list(SOURCES))
+    cli_args = parser.parse_args()
+
+    os.makedirs(cli_args.output_dir, exist_ok=True)
+    for table_name, table in compute_kpis(cli_args.start, cli_args.end, cli_args.source or tuple(SOURCES)).items():
+        path = os.path.join(cli_args.output_dir, f"{table_name}.csv")
+        table.to_csv(path, index=False)
+        print(f"{path}: {len(table)} rows")
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+# Đo thời gian từng bước (đọc CSV, chuẩn hóa, build cube, từng phần biểu đồ, xuất file, ...), chỉ bật khi đặt
+# biến môi trường SUBCON_PROFILE:
+#   SUBCON_PROFILE=1       đo thời gian
+#   SUBCON_PROFILE=memory  đo thêm bộ nhớ cấp phát đỉnh của mỗi bước (tracemalloc, chậm hơn đáng kể;
+#                          đo cho cả process nên các phiên chạy cùng lúc ảnh hưởng lẫn nhau)
+# Mỗi lần chạy trang (hoặc mỗi bước chạy ngoài trang, vd. job xuất file) ghi một dòng JSON vào PROFILE_LOG.
+MODE = os.environ.get("SUBCON_PROFILE", "").strip().lower()
+ENABLED = MODE not in ("", "0", "false", "off")
+TRACE_MEMORY = MODE == "memory"
+PROFILE_LOG = os.environ.get(
+    "SUBCON_PROFILE_LOG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "profile.jsonl"),
+)
+
+if TRACE_MEMORY and not tracemalloc.is_tracing():
+    tracemalloc.start()
+
+# Mỗi luồng (mỗi lần chạy script Streamlit chạy trọn trong một luồng) giữ danh sách bước của lần chạy hiện tại
+# và ngăn xếp các bước đang chạy (bước lồng nhau)
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+def _write(entry):
+    with _log_lock:
+        with open(PROFILE_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def begin_run(page, session=None):
+    # Bắt đầu ghi các bước của một lần chạy trang. Trả về False nếu không bật hoặc đã có lần chạy đang ghi
+    # (vd. fragment chạy cùng lần chạy cả trang): khi đó chỉ người gọi begin_run thành công mới gọi end_run
+    if not ENABLED or getattr(_local, "run", None) is not None:
+        return False
+    _local.run = {"time": datetime.now().isoformat(timespec="seconds"), "page": page, "session": session,
+                  "stages": []}
+    _local.stack = []
+    return True
+
+
+def end_run():
+    # Kết thúc lần chạy: ghi một dòng vào log, trả về danh sách bước (rỗng nếu không bật hoặc chưa begin_run)
+    run = getattr(_local, "run", None)
+    if run is None:
+        return []
+    _local.run = None
+    run["total_ms"] = round(sum(stage["ms"] for stage in run["stages"] if stage["depth"] == 0), 2)
+    _write(run)
+    return run["stages"]
+
+
+def context():
+    # Lần chạy đang ghi của luồng hiện tại và độ sâu bước hiện tại (None nếu không có), để truyền sang luồng worker
+    run = getattr(_local, "run", None)
+    if run is None:
+        return None
+    return run, len(getattr(_local, "stack", None) or [])
+
+
+@contextmanager
+def attach(run_context):
+    # Trong luồng worker: ghi các bước vào lần chạy của luồng gọi (lấy bằng context()), lồng dưới bước đang chạy
+    # ở đó, thay vì ghi thành các dòng riêng không thuộc trang nào
+    if run_context is None:
+        yield
+        return
+    run, depth = run_context
+    _local.run = run
+    _local.stack = [{"peak": 0} for _ in range(depth)]
+    try:
+        yield
+    finally:
+        _local.run = None
+        _local.stack = []
+
+
+@contextmanager
+def stage(name):
+    # with profiling.stage("read csv"): ...  — ghi thời gian (và bộ nhớ đỉnh) của khối lệnh
+    if not ENABLED:
+        yield
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    frame = {"peak": 0}
+    if TRACE_MEMORY:
+        start_memory = tracemalloc.get_traced_memory()[0]
+        if stack:
+            # Giữ lại đỉnh đã đạt của bước cha trước khi đặt lại bộ đếm đỉnh cho bước con
+            stack[-1]["peak"] = max(stack[-1]["peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stack.pop()
+        record = {"stage": name, "depth": len(stack), "ms": round(elapsed * 1000, 2)}
+        if TRACE_MEMORY:
+            peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            record["peak_mib"] = round((peak - start_memory) / 2**20, 2)
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+
+        run = getattr(_local, "run", None)
+        if run is not None:
+            run["stages"].append(record)
+        elif not stack:
+            # Bước chạy ngoài một lần chạy trang (job nền, CLI): ghi riêng thành một dòng
+            _write({"time": datetime.now().isoformat(timespec="seconds"), "page": None, "stages": [record],
+                    "total_ms": record["ms"]})
+
+
+def debug_panel(stages):
+    # Bảng thời gian các bước của lần chạy vừa xong trong sidebar (chỉ khi bật profiling)
+    if not ENABLED:
+        return
+    import pandas as pd
+    import streamlit as st
+
+    with st.sidebar.expander("🐞 Profiling", expanded=False):
+        if not stages:
+            st.caption("No stages recorded in this run.")
+            return
+        # Bước con được ghi trước bước cha; thụt lề theo độ sâu để dễ đọc
+        table = pd.DataFrame(stages)
+        table["stage"] = [" " * depth + name for depth, name in zip(table["depth"], table["stage"])]
+        st.caption(f"Total {sum(s['ms'] for s in stages if s['depth'] == 0):.0f} ms · log: {PROFILE_LOG}")
+        st.dataframe(table.drop(columns="depth"), hide_index=True, use_container_width=True)
@@ -0,0 +1,62 @@
+import os
+
+from utils import kpi
+from utils.defects import defect_rate_matrix
+
+# Các truy vấn của trang Defect Tracking trên một lát cắt Supplier/Year/Week. Có hai backend cùng giao diện,
+# chọn bằng biến môi trường SUBCON_BACKEND:
+#   memory (mặc định)  CubeSource: cube tổng hợp + bảng defect giữ trong bộ nhớ process (utils.cube, utils.filters)
+#   sqlite             SqlSource (utils.sqlstore): file SQLite, các phép tổng hợp chạy bằng SQL,
+#                      chỉ kết quả nhỏ được đọc vào Python
+# Trang chỉ gọi options() / select() của nguồn và các hàm của lát cắt, không phụ thuộc backend.
+BACKENDS = ("memory", "sqlite")
+BACKEND = os.environ.get("SUBCON_BACKEND", "memory").strip().lower()
+if BACKEND not in BACKENDS:
+    raise ValueError(f"SUBCON_BACKEND must be one of {', '.join(BACKENDS)}, got {BACKEND!r}")
+
+
+class CubeSelection:
+    # Lát cắt (Supplier, Year, Week) trên cube; week=None là cả năm
+
+    def __init__(self, filter_index, defects, supplier, year, week=None):
+        self.filter_index = filter_index
+        self.defects = defects
+        self.supplier = supplier
+        self.year = year
+        self.week = week
+
+    def rows(self, whole_year=False):
+        # Các dòng cube của lát cắt (whole_year=True: bỏ qua tuần đã chọn)
+        week = None if whole_year else self.week
+        return self.filter_index.select(Supplier=self.supplier, Year=self.year, Week=week)
+
+    def rate_table(self, by, whole_year=False):
+        return kpi.rate_table(self.rows(whole_year), by)
+
+    def top_models(self):
+        return kpi.top_models(self.rows())
+
+    def defect_totals(self):
+        # Tổng số lỗi theo loại lỗi (Series, theo thứ tự cột gốc)
+        return self.defects.totals(self.rows().index)
+
+    def defect_rate_matrix(self):
+        # Ma trận tỷ lệ lỗi (%) loại lỗi x Model; None nếu không có dòng nào hoặc nguồn không có cột defect
+        rows = self.rows()
+        if rows.empty or len(self.defects.names) == 0:
+            return None
+        return defect_rate_matrix(rows, self.defects)
+
+
+class CubeSource:
+    # Chỉ mục lọc trên cube và bảng defect của một nguồn (dùng chung cho mọi phiên)
+
+    def __init__(self, filter_index, defects):
+        self.filter_index = filter_index
+        self.defects = defects
+
+    def options(self, key):
+        return self.filter_index.options(key)
+
+    def select(self, supplier, year, week=None):
+        return CubeSelection(self.filter_index, self.defects, supplier, year, week)
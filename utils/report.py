@@ -0,0 +1,131 @@
+import argparse
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+from utils import filters, profiling
+from utils.data_loader import SOURCES, data_version, defect_columns
+from utils.export import excel_records, new_workbook, write_records
+
+# Số process tính dòng tổng hợp/top lỗi của các supplier song song (1 = chạy ngay trong process hiện tại);
+# không vượt quá số CPU, process thừa chỉ tranh CPU với process cha đang ghi workbook
+REPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+# Số loại lỗi nhiều nhất của mỗi supplier trong sheet "Top Defects"
+TOP_DEFECTS = 10
+
+SUMMARY_SHEET = "Summary"
+DEFECTS_SHEET = "Top Defects"
+
+# Pool dùng lại giữa các lần tạo báo cáo (process con chỉ import pandas và load dữ liệu một lần).
+# Dùng "spawn" vì process cha (server Streamlit) có nhiều luồng, fork có thể làm process con bị treo.
+_pools = {}
+_lock = threading.Lock()
+
+
+def _pool(workers):
+    with _lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pools[workers]
+
+
+def _supplier_summary(name, year, week, supplier):
+    # Chạy trong process con: lọc dữ liệu của một supplier, tính dòng tổng hợp và top lỗi.
+    # Chỉ trả về các dòng nhỏ này; giá trị các ô của sheet chi tiết do process cha tự lấy từ row_index của nó
+    # (gửi toàn bộ ô qua process khác chậm hơn tự đọc)
+    df = filters.row_index(name).select(Supplier=supplier, Year=year, Week=week)
+    measures = SOURCES[name]["measures"]
+    totals = df[measures].sum()
+    reject_percent = round(totals["Reject Qty"] / totals["Inspection Qty"] * 100, 2) if totals["Inspection Qty"] > 0 else 0
+    summary = [supplier, len(df)] + [int(totals[col]) for col in measures] + [reject_percent]
+
+    defect_totals = df[defect_columns(name, df.columns)].sum()
+    top = defect_totals[defect_totals > 0].sort_values(ascending=False, kind="stable").head(TOP_DEFECTS)
+    top_defects = [[supplier, defect, float(count)] for defect, count in top.items()]
+
+    return summary, top_defects
+
+
+def _sheet_name(supplier, used):
+    # Tên sheet Excel: tối đa 31 ký tự, không chứa []:*?/\ và không trùng nhau (không phân biệt hoa thường)
+    base = re.sub(r"[\[\]:*?/\\]", "_", str(supplier)).strip("'")[:31] or "Sheet"
+    sheet_name, i = base, 1
+    while sheet_name.lower() in used:
+        i += 1
+        sheet_name = f"{base[:31 - len(str(i)) - 1]}~{i}"
+    used.add(sheet_name.lower())
+    return sheet_name
+
+
+def report_suppliers(name, year=None, week=None):
+    # Các supplier có dữ liệu trong Year/Week đã chọn (None = tất cả)
+    return list(filters.row_index(name).select(Year=year, Week=week)["Supplier"].unique().sort_values())
+
+
+def build_report(name, output, year=None, week=None, progress=None, workers=REPORT_WORKERS):
+    # Một workbook cho tất cả supplier của nguồn: sheet "Summary", sheet "Top Defects" và một sheet dữ liệu
+    # chi tiết cho mỗi supplier. Dòng tổng hợp/top lỗi của từng supplier được tính song song trong process pool,
+    # process cha ghi lần lượt các sheet theo thứ tự supplier (xlsxwriter chỉ ghi được từ một luồng).
+    workers = min(workers, os.cpu_count() or 1)
+    row_index = filters.row_index(name)
+    suppliers = report_suppliers(name, year, week)
+    args = ([name] * len(suppliers), [year] * len(suppliers), [week] * len(suppliers), suppliers)
+    if workers > 1 and len(suppliers) > 1:
+        results = _pool(workers).map(_supplier_summary, *args)
+    else:
+        results = map(_supplier_summary, *args)
+
+    workbook = new_workbook(output)
+    summary_sheet = workbook.add_worksheet(SUMMARY_SHEET)
+    defects_sheet = workbook.add_worksheet(DEFECTS_SHEET)
+    used = {SUMMARY_SHEET.lower(), DEFECTS_SHEET.lower()}
+
+    summary_rows, defect_rows = [], []
+    for i, (supplier, (summary, top_defects)) in enumerate(zip(suppliers, results)):
+        summary_rows.append(summary)
+        defect_rows += top_defects
+        df = row_index.select(Supplier=supplier, Year=year, Week=week)
+        write_records(workbook.add_worksheet(_sheet_name(supplier, used)), list(df.columns), excel_records(df))
+        if progress is not None:
+            progress(i + 1, len(suppliers))
+
+    write_records(summary_sheet, ["Supplier", "Rows"] + SOURCES[name]["measures"] + ["Reject %"], summary_rows)
+    write_records(defects_sheet, ["Supplier", "Defect Type", "Defect Qty"], defect_rows)
+    workbook.close()
+    return len(suppliers)
+
+
+def report_bytes(name, year=None, week=None, progress=None, workers=REPORT_WORKERS):
+    output = BytesIO()
+    with profiling.stage(f"{name}: bulk report"):
+        build_report(name, output, year, week, progress, workers)
+    return output.getvalue()
+
+
+def report_cache_key(name, year=None, week=None):
+    return ("report", name, data_version(name), year, week)
+
+
+def report_file_name(name, year=None, week=None):
+    return f"{SOURCES[name]['category']}_AllSubcon_Year{year or 'All'}_Week{week or 'All'}.xlsx"
+
+
+if __name__ == "__main__":
+    # python -m utils.report outsourcing --year 2025 --week 10 [--output pack.xlsx] [--workers 4]
+    parser = argparse.ArgumentParser(description="Build the all-supplier weekly report workbook for a source")
+    parser.add_argument("source", choices=list(SOURCES))
+    parser.add_argument("--year", type=int)
+    parser.add_argument("--week", type=int)
+    parser.add_argument("--output")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS)
+    cli_args = parser.parse_args()
+
+    path = cli_args.output or report_file_name(cli_args.source, cli_args.year, cli_args.week)
+    start = time.perf_counter()
+    n_suppliers = build_report(cli_args.source, path, cli_args.year, cli_args.week, workers=cli_args.workers)
+    print(f"{path}: {n_suppliers} suppliers in {time.perf_counter() - start:.2f} s ({cli_args.workers} workers)")
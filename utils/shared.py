@@ -0,0 +1,214 @@
+import threading
+from collections import OrderedDict
+
+from utils import cube, data_loader, filters, kpi, queries, sqlstore, watcher
+
+try:
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+except ImportError:  # Chạy headless (CLI, benchmark) thì không có phiên Streamlit
+    Runtime = None
+    get_script_run_ctx = None
+
+# Registry dữ liệu chỉ đọc dùng chung cho mọi phiên trong process:
+#   key -> {"version": phiên bản các nguồn, "names": các nguồn, "value": dữ liệu, "loader": hàm build dữ liệu,
+#           "sessions": các phiên đang giữ}
+# Mỗi phiên giữ tối đa một key cho mỗi slot ("home", "tracking", "export"); khi không còn phiên nào giữ
+# một key thì key bị bỏ và cache của các nguồn không còn được dùng cũng được giải phóng.
+# Chỉ các lựa chọn bộ lọc (widget) là trạng thái riêng của từng phiên.
+# Khi luồng theo dõi file (utils.watcher) đang chạy, dữ liệu đã có chỉ được build lại ở luồng đó và thay vào
+# registry khi đã build xong; các lần chạy trang không bao giờ phải đợi build lại hay thấy dữ liệu build dở.
+_entries = {}
+_held = {}  # session_id -> {slot: key}
+_lock = threading.Lock()
+
+# Mỗi key chỉ một luồng build tại một thời điểm để mỗi phiên bản chỉ được load một lần; các key khác nhau build
+# độc lập và người đọc (chỉ cần _lock) không phải đợi build nào
+_build_locks = {}
+
+# Kết quả đã tính (bảng, figure Plotly) của từng phần trang Defect Tracking theo trạng thái bộ lọc (LRU, dùng chung mọi phiên):
+#   (nguồn, phiên bản dữ liệu, phần, bộ lọc...) -> kết quả
+SECTION_CACHE_SIZE = 256
+_sections = OrderedDict()
+_sections_lock = threading.Lock()
+
+
+def session_id():
+    # Id của phiên Streamlit đang chạy script, None khi chạy ngoài Streamlit
+    if get_script_run_ctx is None:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _read_only(*arrays):
+    # Dữ liệu dùng chung không được sửa tại chỗ (DataFrame đã được bảo vệ bởi copy-on-write của pandas)
+    for array in arrays:
+        array.setflags(write=False)
+
+
+def _drop(key):
+    # Gọi khi đang giữ _lock
+    entry = _entries.pop(key)
+    used = {name for other in _entries.values() for name in other["names"]}
+    for name in entry["names"]:
+        if name not in used:
+            data_loader.forget(name)
+            cube.forget(name)
+            filters.forget(name)
+
+
+def _release(session, slot):
+    # Gọi khi đang giữ _lock
+    key = _held.get(session, {}).pop(slot, None)
+    if key is None or key not in _entries:
+        return
+    sessions = _entries[key]["sessions"]
+    sessions.discard(session)
+    if not sessions:
+        _drop(key)
+
+
+def release_session(session):
+    with _lock:
+        for slot in list(_held.get(session, {})):
+            _release(session, slot)
+        _held.pop(session, None)
+
+
+def _prune():
+    # Trả lại tham chiếu của các phiên đã đóng (tab bị tắt, hết hạn)
+    if Runtime is None or not Runtime.exists():
+        return
+    runtime = Runtime.instance()
+    with _lock:
+        sessions = list(_held)
+    for session in sessions:
+        if not runtime.is_active_session(session):
+            release_session(session)
+
+
+def _build_lock(key):
+    with _lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def _needs_build(entry, names):
+    # Chưa có dữ liệu, hoặc dữ liệu đã cũ và không có luồng watcher build lại thay
+    if entry is None:
+        return True
+    if watcher.is_running():
+        return False
+    return entry["version"] != tuple(data_loader.data_version(name) for name in names)
+
+
+def _store(key, names, loader, version, value):
+    # Thay dữ liệu của key (version + value cùng lúc); các phiên đang giữ key vẫn được giữ nguyên
+    with _lock:
+        old = _entries.get(key)
+        sessions = old["sessions"] if old is not None else set()
+        entry = {"version": version, "names": names, "value": value, "loader": loader, "sessions": sessions}
+        _entries[key] = entry
+    return entry
+
+
+def _acquire(slot, key, names, loader):
+    session = session_id()
+
+    with _lock:
+        entry = _entries.get(key)
+    if _needs_build(entry, names):
+        with _build_lock(key):
+            # Luồng khác có thể vừa build xong trong lúc chờ
+            with _lock:
+                entry = _entries.get(key)
+            if _needs_build(entry, names):
+                version = tuple(data_loader.data_version(name) for name in names)
+                entry = _store(key, names, loader, version, loader())
+
+    _prune()
+    if session is not None:
+        with _lock:
+            if _held.get(session, {}).get(slot) != key:
+                _release(session, slot)
+                _held.setdefault(session, {})[slot] = key
+            # key có thể vừa bị bỏ nếu chính phiên này là phiên cuối cùng giữ nó
+            _entries.setdefault(key, entry)["sessions"].add(session)
+    return entry["version"], entry["value"]
+
+
+def _rebuild(changed):
+    # Gọi từ luồng watcher khi nội dung các nguồn `changed` đổi: build lại dữ liệu của các key đang được giữ có
+    # dùng các nguồn đó, mỗi key được thay (version + value cùng lúc) ngay khi build xong
+    with _lock:
+        keys = [key for key, entry in _entries.items() if set(entry["names"]) & set(changed)]
+    for key in keys:
+        with _build_lock(key):
+            with _lock:
+                entry = _entries.get(key)
+            if entry is None:
+                continue
+            version = tuple(data_loader.data_version(name) for name in entry["names"])
+            value = entry["loader"]()
+            with _lock:
+                if key in _entries:
+                    _entries[key] = {**_entries[key], "version": version, "value": value}
+
+
+def watch_data():
+    # Bật luồng theo dõi file nguồn (một lần cho cả process) và fragment tự chạy lại trang khi có dữ liệu mới
+    watcher.start(_rebuild)
+    watcher.live_reload()
+
+
+def _load_home(names):
+    rollup = filters.DailyRollup(data_loader.load_combined(names), kpi.HOME_MEASURES)
+    _read_only(rollup.bounds, rollup.days, rollup.cumulative)
+    return rollup
+
+
+def home_data():
+    # Tổng Input Qty/Reject Qty theo (Category, ngày) kèm tổng lũy kế, gộp từ cả 3 nguồn cho trang Home
+    names = tuple(data_loader.SOURCES)
+    return _acquire("home", ("home",), names, lambda: _load_home(names))[1]
+
+
+def _load_tracking(name):
+    if queries.BACKEND == "sqlite":
+        return sqlstore.SqlSource(name)
+    filter_index = filters.cube_index(name)
+    defects = cube.load_defects(name)
+    _read_only(filter_index.composite, *filter_index.codes.values(), defects.row_ids, defects.codes, defects.counts)
+    return queries.CubeSource(filter_index, defects)
+
+
+def tracking_data(name):
+    # (phiên bản dữ liệu, nguồn truy vấn) cho các biểu đồ Defect Tracking; nguồn là queries.CubeSource hoặc
+    # sqlstore.SqlSource theo SUBCON_BACKEND. Key cache kết quả phải dùng phiên bản này (không đọc lại từ file)
+    # để luôn khớp với dữ liệu được trả về
+    return _acquire("tracking", ("tracking", name), (name,), lambda: _load_tracking(name))
+
+
+def export_index(name):
+    # (phiên bản dữ liệu, chỉ mục lọc trên dữ liệu chi tiết) của một nguồn, chỉ load khi người dùng xuất file
+    return _acquire("export", ("export", name), (name,), lambda: filters.row_index(name))
+
+
+def section_result(key, compute):
+    # key = (nguồn, phiên bản dữ liệu, ...); compute() chỉ chạy khi chưa có kết quả cho key.
+    # Kết quả dùng chung giữa các phiên nên nơi gọi không được sửa tại chỗ.
+    with _sections_lock:
+        if key in _sections:
+            _sections.move_to_end(key)
+            return _sections[key]
+
+    value = compute()
+
+    with _sections_lock:
+        # Kết quả của phiên bản dữ liệu cũ không còn được dùng nữa
+        for stale in [other for other in _sections if other[0] == key[0] and other[1] != key[1]]:
+            del _sections[stale]
+        _sections[key] = value
+        while len(_sections) > SECTION_CACHE_SIZE:
+            _sections.popitem(last=False)
+    return value
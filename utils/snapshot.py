@@ -0,0 +1,131 @@
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Không có pyarrow thì loader đọc thẳng từ CSV
+    pa = None
+    feather = None
+
+# Thư mục chứa snapshot dạng cột (Arrow IPC), nằm cạnh file CSV gốc
+SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", ".snapshot")
+
+# Số segment append tối đa trước khi gộp lại thành một file
+MAX_SEGMENTS = 16
+
+# Mỗi nguồn gồm một manifest JSON và danh sách segment Arrow IPC:
+#   {name}.json            -> phiên bản CSV, byte offset đã ingest, fingerprint, danh sách segment
+#   {name}-{gen}-{seq}.arrow -> segment 0 là dữ liệu gốc, các segment sau là các dòng được append thêm
+
+
+def is_available():
+    return pa is not None
+
+
+def manifest_path(name):
+    return os.path.join(SNAPSHOT_DIR, f"{name}.json")
+
+
+def read_manifest(name):
+    path = manifest_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_manifest(name, manifest):
+    # Ghi ra file tạm rồi đổi tên để người đọc không thấy manifest ghi dở
+    path = manifest_path(name)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+def snapshot_version(name):
+    # Phiên bản file CSV mà snapshot được build từ đó, None nếu chưa có snapshot
+    if not is_available():
+        return None
+    manifest = read_manifest(name)
+    if manifest is None:
+        return None
+    return (manifest["source_mtime_ns"], manifest["source_size"])
+
+
+def snapshot_columns(name):
+    return read_manifest(name)["columns"]
+
+
+def _write_segment(name, table, generation, seq):
+    # File Arrow IPC không nén để có thể memory-map khi đọc
+    filename = f"{name}-{generation}-{seq:06d}.arrow"
+    path = os.path.join(SNAPSHOT_DIR, filename)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    feather.write_feather(table, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return filename
+
+
+def _remove_segments(filenames):
+    for filename in filenames:
+        try:
+            os.remove(os.path.join(SNAPSHOT_DIR, filename))
+        except FileNotFoundError:
+            pass
+
+
+def _write_generation(name, table, manifest):
+    # Ghi toàn bộ dữ liệu thành một thế hệ snapshot mới và thay manifest; xóa segment của thế hệ cũ sau khi đổi
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    old_manifest = read_manifest(name)
+    generation = old_manifest["generation"] + 1 if old_manifest else 0
+
+    segment = _write_segment(name, table, generation, 0)
+
+    manifest = {**manifest, "generation": generation, "segments": [segment], "columns": table.schema.names}
+    _write_manifest(name, manifest)
+    if old_manifest:
+        _remove_segments(old_manifest["segments"])
+
+
+def write_snapshot(name, df, manifest):
+    _write_generation(name, pa.Table.from_pandas(df, preserve_index=False), manifest)
+
+
+def update_manifest(name, manifest):
+    # Cập nhật phiên bản/offset mà không thêm segment mới
+    _write_manifest(name, {**read_manifest(name), **manifest})
+
+
+def append_segment(name, df, manifest):
+    # Ghi các dòng mới thành một segment riêng, ép về đúng schema của segment gốc
+    old_manifest = read_manifest(name)
+    with pa.memory_map(os.path.join(SNAPSHOT_DIR, old_manifest["segments"][0])) as source:
+        schema = pa.ipc.open_file(source).schema
+    table = pa.Table.from_pandas(df[schema.names], schema=schema, preserve_index=False)
+
+    if len(old_manifest["segments"]) >= MAX_SEGMENTS:
+        # Quá nhiều segment: gộp toàn bộ thành một file (không cần parse lại CSV)
+        tables = [_read_segment(segment) for segment in old_manifest["segments"]] + [table]
+        _write_generation(name, pa.concat_tables(tables).combine_chunks().unify_dictionaries(), manifest)
+        return
+
+    segment = _write_segment(name, table, old_manifest["generation"], len(old_manifest["segments"]))
+
+    manifest = {**old_manifest, **manifest, "segments": old_manifest["segments"] + [segment]}
+    _write_manifest(name, manifest)
+
+
+def _read_segment(segment, columns=None):
+    return feather.read_table(os.path.join(SNAPSHOT_DIR, segment), columns=columns, memory_map=True)
+
+
+def read_snapshot(name, columns=None, manifest=None):
+    # Chỉ đọc các cột cần dùng (column projection) từ các segment đã memory-map.
+    # manifest: đọc đúng các segment của một manifest đã đọc trước đó (nhiều lần đọc cùng một phiên bản)
+    if manifest is None:
+        manifest = read_manifest(name)
+    tables = [_read_segment(segment, columns) for segment in manifest["segments"]]
+    return pa.concat_tables(tables).to_pandas()
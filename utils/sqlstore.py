@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+
+from utils import cube, kpi, profiling, snapshot
+from utils.data_loader import SOURCES, data_version, read_columns
+from utils.defects import rate_matrix
+
+# Backend SQLite cho trang Defect Tracking (SUBCON_BACKEND=sqlite): mỗi nguồn là một bảng dữ liệu chi tiết
+# (các cột cube_keys + measures, index trên Supplier/Year/Week/Model) và một bảng số lỗi dạng dài
+# (row_id, mã lỗi, số lượng; chỉ các ô khác 0). Các bảng tổng hợp của biểu đồ được tính bằng SQL,
+# chỉ kết quả (vài chục dòng) được đọc vào Python, nên process không phải giữ dữ liệu của nguồn trong bộ nhớ.
+# File được build lại (trong một transaction) khi file CSV đổi phiên bản.
+
+# Chỉ một luồng build tại một thời điểm
+_build_lock = threading.Lock()
+
+
+def db_path():
+    # File SQLite nằm trong thư mục snapshot (đọc SNAPSHOT_DIR lúc gọi để benchmark trỏ được sang thư mục khác)
+    return os.path.join(snapshot.SNAPSHOT_DIR, "subcon.sqlite")
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _tables(name):
+    # (bảng dữ liệu, bảng số lỗi, bảng tên loại lỗi) của một nguồn
+    return _quote(name), _quote(f"{name}_defects"), _quote(f"{name}_defect_types")
+
+
+def _connect():
+    # Mỗi lần truy vấn mở một kết nối riêng (rẻ với SQLite), dùng được từ mọi luồng của Streamlit
+    return sqlite3.connect(db_path(), timeout=60, isolation_level=None)
+
+
+def _stored_version(conn, name):
+    conn.execute("CREATE TABLE IF NOT EXISTS sources (name TEXT PRIMARY KEY, version TEXT)")
+    row = conn.execute("SELECT version FROM sources WHERE name = ?", (name,)).fetchone()
+    return row[0] if row is not None else None
+
+
+def _read(name, manifest):
+    # (phiên bản, dữ liệu chi tiết, bảng số lỗi) đọc từ cùng một manifest snapshot; row_id là vị trí dòng.
+    # None nếu số dòng giữa các lần đọc không khớp (cube.build_pinned build lại)
+    config = SOURCES[name]
+    df = read_columns(name, config["cube_keys"] + config["measures"], manifest)
+    defects = cube.read_defects(name, manifest, np.arange(len(df)))
+    if defects is None:
+        return None
+    if manifest is not None:
+        version = (manifest["source_mtime_ns"], manifest["source_size"])
+    else:
+        version = data_version(name)
+    return json.dumps(list(version)), df, defects
+
+
+def _build(conn, name, version, df, defects):
+    # Ghi lại toàn bộ bảng của nguồn trong một transaction: người đọc thấy dữ liệu cũ cho tới khi commit
+    config = SOURCES[name]
+    columns = config["cube_keys"] + config["measures"]
+    table, defects_table, types_table = _tables(name)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for old in (table, defects_table, types_table):
+            conn.execute(f"DROP TABLE IF EXISTS {old}")
+
+        definitions = ", ".join(f"{_quote(col)} {'INTEGER' if col in config['numeric_columns'] else 'TEXT'}"
+                                for col in columns)
+        conn.execute(f"CREATE TABLE {table} (row_id INTEGER PRIMARY KEY, {definitions})")
+        conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * (len(columns) + 1))})",
+                         zip(range(len(df)), *(df[col].tolist() for col in columns)))
+        filter_keys = ", ".join(_quote(col) for col in ["Supplier", "Year", "Week", "Model"])
+        conn.execute(f"CREATE INDEX {_quote(f'{name}_filter')} ON {table} ({filter_keys})")
+
+        # Bảng số lỗi dạng dài (chỉ các ô khác 0), cùng mã lỗi với DefectTable
+        conn.execute(f"CREATE TABLE {types_table} (code INTEGER PRIMARY KEY, name TEXT)")
+        conn.executemany(f"INSERT INTO {types_table} VALUES (?, ?)", enumerate(defects.names))
+        conn.execute(f"CREATE TABLE {defects_table} (row_id INTEGER, code INTEGER, qty INTEGER)")
+        conn.executemany(f"INSERT INTO {defects_table} VALUES (?, ?, ?)",
+                         zip(defects.row_ids.tolist(), defects.codes.tolist(), defects.counts.tolist()))
+        # Index phủ (row_id, code, qty): phép join theo row_id không phải đọc lại bảng
+        conn.execute(f"CREATE INDEX {_quote(f'{name}_defects_row')} ON {defects_table} (row_id, code, qty)")
+
+        conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (name, version))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def ensure(name):
+    # Build bảng của nguồn nếu chưa có hoặc file CSV đã đổi phiên bản
+    version = json.dumps(list(data_version(name)))
+    with _build_lock:
+        os.makedirs(snapshot.SNAPSHOT_DIR, exist_ok=True)
+        with closing(_connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            if _stored_version(conn, name) != version:
+                with profiling.stage(f"{name}: build sqlite"):
+                    _build(conn, name, *cube.build_pinned(name, lambda manifest: _read(name, manifest), "sqlite"))
+
+
+class SqlSelection:
+    # Lát cắt (Supplier, Year, Week) của một nguồn SQLite; week=None là cả năm. Cùng giao diện với
+    # queries.CubeSelection, mỗi hàm là một truy vấn tổng hợp
+
+    def __init__(self, source, supplier, year, week=None):
+        self.source = source
+        self.supplier = supplier
+        self.year = year
+        self.week = week
+
+    def _where(self, whole_year=False):
+        clauses, params = ['r."Supplier" = ?', 'r."Year" = ?'], [self.supplier, int(self.year)]
+        if self.week is not None and not whole_year:
+            clauses.append('r."Week" = ?')
+            params.append(int(self.week))
+        return " AND ".join(clauses), params
+
+    def rate_table(self, by, whole_year=False):
+        # Tổng các measure theo nhóm `by` (sắp xếp theo nhóm như groupby) và các tỷ lệ (%)
+        by = [by] if isinstance(by, str) else list(by)
+        groups = ", ".join(f"r.{_quote(col)}" for col in by)
+        selected = ", ".join(f"r.{_quote(col)} AS {_quote(col)}" for col in by)
+        sums = ", ".join(f"SUM(r.{_quote(col)}) AS {_quote(col)}" for col in self.source.measures)
+        where, params = self._where(whole_year)
+        table = self.source.query(
+            f"SELECT {selected}, {sums} FROM {self.source.table} r WHERE {where} GROUP BY {groups} ORDER BY {groups}",
+            params)
+        # Kết quả rỗng không có kiểu cột; SUM của cột INTEGER luôn là số nguyên
+        table = table.astype({col: "int64" for col in self.source.measures})
+        return kpi.with_rates(table, self.source.measures)
+
+    def top_models(self):
+        return kpi.rank_models(self.rate_table("Model"))
+
+    def defect_totals(self):
+        # Tổng số lỗi theo loại lỗi (Series, theo thứ tự cột gốc)
+        where, params = self._where()
+        sums = self.source.query(
+            f"SELECT d.code, SUM(d.qty) AS qty FROM {self.source.table} r "
+            f"JOIN {self.source.defects_table} d ON d.row_id = r.row_id WHERE {where} GROUP BY d.code", params)
+        totals = np.zeros(len(self.source.names))
+        totals[sums["code"].to_numpy(dtype=np.int64)] = sums["qty"].to_numpy(dtype=float)
+        return pd.Series(totals, index=self.source.names)
+
+    def defect_rate_matrix(self):
+        # Ma trận tỷ lệ lỗi (%) loại lỗi x Model; None nếu không có dòng nào hoặc nguồn không có cột defect
+        if not self.source.names:
+            return None
+        where, params = self._where()
+        inspection = self.source.query(
+            f'SELECT r."Model" AS "Model", SUM(r."Inspection Qty") AS inspection FROM {self.source.table} r '
+            f'WHERE {where} GROUP BY r."Model" ORDER BY r."Model"', params)
+        if inspection.empty:
+            return None
+        sums = self.source.query(
+            f'SELECT r."Model" AS "Model", d.code, SUM(d.qty) AS qty FROM {self.source.table} r '
+            f'JOIN {self.source.defects_table} d ON d.row_id = r.row_id WHERE {where} GROUP BY r."Model", d.code',
+            params)
+
+        models = pd.Index(inspection["Model"])
+        counts = np.zeros((len(models), len(self.source.names)))
+        counts[models.get_indexer(sums["Model"]), sums["code"].to_numpy(dtype=np.int64)] = sums["qty"].to_numpy(dtype=float)
+        return rate_matrix(counts, inspection["inspection"].to_numpy(), models, self.source.names)
+
+
+class SqlSource:
+    # Một nguồn trong file SQLite (build khi cần), cùng giao diện với queries.CubeSource
+
+    def __init__(self, name):
+        ensure(name)
+        self.name = name
+        self.table, self.defects_table, types_table = _tables(name)
+        self.measures = kpi.rate_measures(SOURCES[name]["measures"])
+        self.names = list(self.query(f"SELECT name FROM {types_table} ORDER BY code")["name"])
+
+    def query(self, sql, params=()):
+        with closing(_connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def options(self, key):
+        # Các giá trị khác nhau (đã sắp xếp) của một cột lọc
+        return list(self.query(f"SELECT DISTINCT {_quote(key)} FROM {self.table} ORDER BY 1")[key])
+
+    def select(self, supplier, year, week=None):
+        return SqlSelection(self, supplier, year, week)
+
+
+if __name__ == "__main__":
+    # python -m utils.sqlstore  -> build (hoặc cập nhật) file SQLite cho tất cả nguồn
+    parser = argparse.ArgumentParser(description="Build the SQLite backend used by SUBCON_BACKEND=sqlite")
+    parser.add_argument("--source", action="append", choices=list(SOURCES))
+    cli_args = parser.parse_args()
+
+    for source_name in cli_args.source or SOURCES:
+        source = SqlSource(source_name)
+        n_rows = source.query(f"SELECT COUNT(*) AS n FROM {source.table}")["n"][0]
+        n_defects = source.query(f"SELECT COUNT(*) AS n FROM {source.defects_table}")["n"][0]
+        print(f"{source_name}: {n_rows} rows, {n_defects} non-zero defect cells -> {db_path()}")
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import threading
+
+from utils.data_loader import SOURCES
+
+# Luồng nền theo dõi các file CSV nguồn: mỗi WATCH_INTERVAL giây so sánh (mtime, size); khi file đổi và đã
+# ghi xong (không đổi thêm trong một chu kỳ) thì so sánh hash nội dung, chỉ khi nội dung thật sự khác mới gọi
+# on_change(các nguồn đã đổi) để build lại dữ liệu dẫn xuất rồi tăng generation.
+# Trong lúc build, các trang vẫn dùng dữ liệu cũ (đầy đủ, nhất quán); các phiên thấy generation mới sẽ tự chạy lại.
+WATCH_INTERVAL = 2.0
+
+HASH_CHUNK = 1024 * 1024
+
+_state = {"thread": None, "generation": 0, "error": None}
+_lock = threading.Lock()
+_stop = threading.Event()
+
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def content_hash(path):
+    # Hash toàn bộ nội dung file (đọc từng khối, không giữ cả file trong bộ nhớ); None nếu file không tồn tại
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+                digest.update(chunk)
+    except FileNotFoundError:
+        return None
+    return digest.hexdigest()
+
+
+def _watch(on_change, interval):
+    seen = {name: _stat(config["path"]) for name, config in SOURCES.items()}
+    hashes = {name: content_hash(config["path"]) for name, config in SOURCES.items()}
+    pending = {}  # name -> (mtime, size) lần thấy trước, chờ file ghi xong
+
+    while not _stop.wait(interval):
+        changed = {}  # name -> ((mtime, size), hash) mới, chỉ ghi nhận khi build lại thành công
+        for name, config in SOURCES.items():
+            stat = _stat(config["path"])
+            if stat == seen[name]:
+                pending.pop(name, None)
+                continue
+            if pending.get(name) != stat:
+                # File vừa đổi hoặc vẫn đang được ghi: đợi thêm một chu kỳ
+                pending[name] = stat
+                continue
+            pending.pop(name, None)
+            digest = content_hash(config["path"])
+            if digest is not None and digest != hashes[name]:
+                changed[name] = (stat, digest)
+            else:
+                seen[name] = stat
+
+        if changed:
+            try:
+                on_change(list(changed))
+                _state["error"] = None
+            except Exception as e:
+                # Build lỗi (vd. file đọc lúc đang ghi dở): giữ dữ liệu cũ; các nguồn này vẫn được coi là đã đổi
+                # nên sẽ được build lại ở các chu kỳ sau
+                _state["error"] = e
+                continue
+            for name, (stat, digest) in changed.items():
+                seen[name], hashes[name] = stat, digest
+            with _lock:
+                _state["generation"] += 1
+
+
+def start(on_change, interval=WATCH_INTERVAL):
+    # Chạy luồng theo dõi (một lần cho cả process; gọi lại không có tác dụng)
+    with _lock:
+        if _state["thread"] is not None:
+            return
+        _stop.clear()
+        _state["thread"] = threading.Thread(target=_watch, args=(on_change, interval), name="data-watcher", daemon=True)
+        _state["thread"].start()
+
+
+def stop():
+    with _lock:
+        thread, _state["thread"] = _state["thread"], None
+    if thread is not None:
+        _stop.set()
+        thread.join()
+
+
+def is_running():
+    return _state["thread"] is not None
+
+
+def generation():
+    # Tăng mỗi lần dữ liệu mới đã được build xong và thay vào
+    return _state["generation"]
+
+
+def last_error():
+    return _state["error"]
+
+
+def live_reload(interval=WATCH_INTERVAL):
+    # Fragment chạy mỗi `interval` giây: khi có generation mới thì chạy lại cả trang với dữ liệu mới
+    # (không tải lại trình duyệt, bộ lọc giữ nguyên)
+    import streamlit as st
+
+    st.session_state.setdefault("data_generation", generation())
+
+    @st.fragment(run_every=interval)
+    def check_generation():
+        if st.session_state["data_generation"] != generation():
+            st.session_state["data_generation"] = generation()
+            st.rerun()
+        if last_error() is not None:
+            st.caption(f"⚠️ Data reload failed, showing the previous data: {last_error()}")
+
+    check_generation()